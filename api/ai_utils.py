@@ -17,12 +17,21 @@ def load_model():
 
 # modello globale
 models = {"BTCUSDT": load_model()}
+model_version = 1  # incrementato a ogni ricarica dei modelli
 
 def reload_models():
     """Ricarica i modelli dal file .pkl"""
+    global model_version
     models["BTCUSDT"] = load_model()
+    model_version += 1
     return {"status": "ok", "message": "Modello ricaricato"}
 
+def model_key_for(symbol: str):
+    """Chiave del modello da usare per il simbolo (fallback BTCUSDT)"""
+    if symbol in models:
+        return symbol
+    return "BTCUSDT" if "BTCUSDT" in models else None
+
 # Colonne delle feature usate dal modello
 FEATURE_COLUMNS = ["close", "rsi", "ema20", "ema50", "macd", "macd_signal", "macd_diff"]
 
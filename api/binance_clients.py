@@ -0,0 +1,39 @@
+import asyncio
+import logging
+from binance import AsyncClient, BinanceSocketManager
+
+log = logging.getLogger(__name__)
+
+# Client asincrono condiviso da tutti gli stream del processo
+_client = None
+_bsm = None
+_lock = asyncio.Lock()
+
+
+async def get_async_client() -> AsyncClient:
+    """Restituisce l'AsyncClient condiviso (creato al primo uso)"""
+    global _client, _bsm
+    async with _lock:
+        if _client is None:
+            _client = await AsyncClient.create()
+            _bsm = BinanceSocketManager(_client)
+    return _client
+
+
+async def get_socket_manager() -> BinanceSocketManager:
+    """Restituisce il BinanceSocketManager condiviso (creato al primo uso)"""
+    await get_async_client()
+    return _bsm
+
+
+async def close_clients():
+    """Chiude il client condiviso (da chiamare allo shutdown dell'app)"""
+    global _client, _bsm
+    async with _lock:
+        if _client is not None:
+            try:
+                await _client.close_connection()
+            except Exception as e:
+                log.warning("Errore chiusura client Binance: %s", e)
+        _client = None
+        _bsm = None
@@ -0,0 +1,71 @@
+import time
+from .rest_client import rest
+from .single_flight import SingleFlight
+from .intervals import interval_ms
+from .ring_buffer import CandleRing
+from .indicators import WARMUP_CANDLES
+from .settings import SIGNAL_WINDOW, SIGNAL_BOOTSTRAP
+
+# Finestra iniziale di candele chiuse per (simbolo, intervallo), condivisa da
+# tutte le pipeline: una sola richiesta REST asincrona anche con più
+# richieste concorrenti (single-flight), poi la cache viene tenuta
+# aggiornata dallo stream live e le richieste successive non toccano il REST.
+
+
+class CandleBootstrap:
+    """Cache delle candele chiuse recenti con caricamento REST single-flight"""
+
+    def __init__(self, capacity: int = SIGNAL_WINDOW, limit: int = SIGNAL_BOOTSTRAP):
+        # abbastanza candele chiuse da rendere pronti tutti gli indicatori
+        # (+1: la candela ancora aperta restituita dal REST viene scartata)
+        self.capacity = max(capacity, WARMUP_CANDLES)
+        self.limit = max(limit, WARMUP_CANDLES + 1)
+        self._windows = {}  # (simbolo, intervallo) -> CandleRing di candele chiuse
+        self._flights = SingleFlight()  # un caricamento REST per chiave alla volta
+        # metriche
+        self.hits = 0
+        self.fetches = 0
+
+    def _fresh(self, window: CandleRing, interval: str) -> bool:
+        # nessuna candela chiusa mancante rispetto a ora
+        if not len(window):
+            return False
+        return window.last_t + 2 * interval_ms(interval) > time.time() * 1000
+
+    async def get(self, symbol: str, interval: str = "1m") -> CandleRing:
+        """Finestra di candele chiuse (da non modificare: copiarla se serve)"""
+        key = (symbol, interval)
+        window = self._windows.get(key)
+        if window is not None and self._fresh(window, interval):
+            self.hits += 1
+            return window
+        return await self._flights.do(key, lambda: self._fetch(symbol, interval))
+
+    async def _fetch(self, symbol: str, interval: str) -> CandleRing:
+        self.fetches += 1
+        data = await rest.klines(symbol, interval, self.limit)
+        now_ms = int(time.time() * 1000)
+        window = CandleRing(self.capacity)
+        for c in data:
+            if c[6] < now_ms:  # esclude la candela ancora aperta
+                window.append(c[0], float(c[1]), float(c[2]), float(c[3]), float(c[4]), float(c[5]))
+        self._windows[(symbol, interval)] = window
+        return window
+
+    def update(self, symbol: str, interval: str, k: dict):
+        """Aggiunge una candela chiusa ricevuta dallo stream live"""
+        window = self._windows.get((symbol, interval))
+        if window is not None and k["x"]:
+            window.push(k["t"], float(k["o"]), float(k["h"]), float(k["l"]), float(k["c"]), float(k["v"]))
+
+    def stats(self) -> dict:
+        return {
+            "windows": len(self._windows),
+            "hits": self.hits,
+            "fetches": self.fetches,
+            "coalesced": self._flights.coalesced,
+        }
+
+
+# cache condivisa dal processo
+bootstrap = CandleBootstrap()
@@ -0,0 +1,186 @@
+import time
+from collections import OrderedDict
+from .rest_client import rest
+from .weight_budget import BULK, REALTIME
+from .single_flight import SingleFlight
+from .intervals import interval_ms
+from .ring_buffer import CandleRing
+from .settings import CANDLE_STORE_CAPACITY, CANDLE_STORE_OPEN_MAX_AGE_MS, CANDLE_STORE_MAX_SERIES
+
+# Candele recenti per (simbolo, intervallo) servite da /candles senza
+# chiamare Binance a ogni richiesta. Al primo uso di una chiave le candele
+# vengono caricate una volta via REST, poi gli stream kline attivi (hub di
+# /ws/candles1s e pipeline di /ws/signals) aggiungono le candele chiuse e
+# aggiornano quella in corso. Il REST resta per i casi che la memoria non
+# copre: limit oltre la capacità, intervalli non allineati al giorno,
+# candele mancanti (nessuno stream attivo) o candela in corso troppo vecchia;
+# in quest'ultimo caso si scaricano solo le candele successive all'ultima.
+# Il numero di serie è limitato: oltre CANDLE_STORE_MAX_SERIES si scarta la
+# meno usata di recente tra quelle senza uno stream live che le aggiorna.
+
+DAY_MS = 86_400_000
+MAX_LIMIT = 1000  # righe massime per richiesta klines di Binance
+
+
+def storable(interval: str) -> bool:
+    """Intervalli con aperture allineate al giorno (1w e 1M no)"""
+    try:
+        ms = interval_ms(interval)
+    except ValueError:
+        return False
+    return ms <= DAY_MS and DAY_MS % ms == 0
+
+
+def _record(t, o, h, l, c, v) -> dict:
+    return {"t": int(t), "o": o, "h": h, "l": l, "c": c, "v": v}
+
+
+def _row(c: list) -> tuple:
+    """Riga REST klines → (t, o, h, l, c, v)"""
+    return c[0], float(c[1]), float(c[2]), float(c[3]), float(c[4]), float(c[5])
+
+
+class CandleStore:
+    """Candele chiuse in CandleRing più la candela in corso, per simbolo e intervallo"""
+
+    def __init__(self, capacity: int = CANDLE_STORE_CAPACITY, open_max_age_ms: float = CANDLE_STORE_OPEN_MAX_AGE_MS,
+                 max_series: int = CANDLE_STORE_MAX_SERIES):
+        self.capacity = min(capacity, MAX_LIMIT)
+        self.open_max_age_ms = open_max_age_ms
+        self.max_series = max_series
+        self._rings = OrderedDict()  # (simbolo, intervallo) -> CandleRing di candele chiuse, dalla meno usata
+        self._streamed = {}  # (simbolo, intervallo) -> ms dell'ultimo aggiornamento dallo stream
+        self._open = {}  # (simbolo, intervallo) -> (candela in corso, ricevuta alle ms)
+        self._complete = set()  # chiavi di cui il REST ha restituito tutta la storia
+        self._flights = SingleFlight()  # un caricamento REST per chiave alla volta
+        # metriche
+        self.hits = 0
+        self.fetches = 0
+        self.topups = 0
+        self.fallbacks = 0
+        self.evictions = 0
+
+    def _covers(self, key: tuple, ms: int, limit: int, now_ms: float) -> bool:
+        ring = self._rings.get(key)
+        if ring is None or not len(ring):
+            return False
+        current = now_ms - now_ms % ms
+        if ring.last_t + ms < current:
+            return False  # candele chiuse mancanti
+        if len(ring) < limit - 1 and key not in self._complete:
+            return False
+        last = self._open.get(key)
+        if ring.last_t + ms == current:
+            # la candela in corso deve essere recente (stream attivo o REST da poco)
+            return last is not None and last[0][0] == current and now_ms - last[1] <= self.open_max_age_ms
+        return True
+
+    def _records(self, key: tuple, limit: int) -> list:
+        ring = self._rings[key]
+        last = self._open.get(key)
+        if last is None or (len(ring) and last[0][0] <= ring.last_t):
+            return ring.to_records(limit)
+        closed = ring.to_records(limit - 1) if limit > 1 else []
+        return closed + [_record(*last[0])]
+
+    async def get(self, symbol: str, interval: str = "1m", limit: int = 500) -> list:
+        """Ultime `limit` candele (l'ultima può essere in corso), come GET klines di Binance"""
+        if limit < 1:
+            return []
+        if limit > self.capacity or not storable(interval):
+            self.fallbacks += 1
+            # oltre la capacità è storico: non usa la riserva del budget per il realtime
+            data = await rest.klines(symbol, interval, limit, BULK if limit > self.capacity else REALTIME)
+            return [_record(*_row(c)) for c in data]
+        key = (symbol, interval)
+        ms = interval_ms(interval)
+        if self._covers(key, ms, limit, time.time() * 1000):
+            self.hits += 1
+            self._rings.move_to_end(key)
+            return self._records(key, limit)
+        while True:
+            await self._flights.do(key, lambda: self._fetch(symbol, interval))
+            if key in self._rings:  # altrimenti scartata nel frattempo per fare posto
+                return self._records(key, limit)
+
+    def _live(self, key: tuple, now_ms: float) -> bool:
+        streamed = self._streamed.get(key)
+        return streamed is not None and now_ms - streamed <= self.open_max_age_ms
+
+    def _drop(self, key: tuple):
+        self._rings.pop(key, None)
+        self._open.pop(key, None)
+        self._streamed.pop(key, None)
+        self._complete.discard(key)
+
+    def _make_room(self):
+        """Scarta serie finché ce n'è posto per una nuova (prima quelle senza stream live)"""
+        now_ms = time.time() * 1000
+        while self._rings and len(self._rings) >= self.max_series:
+            # in ordine dalla meno usata; se sono tutte live si scarta comunque la prima
+            victim = next((k for k in self._rings if not self._live(k, now_ms)), next(iter(self._rings)))
+            self._drop(victim)
+            self.evictions += 1
+
+    async def _fetch(self, symbol: str, interval: str):
+        key = (symbol, interval)
+        ms = interval_ms(interval)
+        ring = self._rings.get(key)
+        now_ms = time.time() * 1000
+        if ring is not None and len(ring) and now_ms - ring.last_t < MAX_LIMIT * ms:
+            # solo le candele successive all'ultima chiusa in memoria
+            self.topups += 1
+            data = await rest.klines(symbol, interval, MAX_LIMIT, startTime=int(ring.last_t) + ms)
+        else:
+            self.fetches += 1
+            data = await rest.klines(symbol, interval, self.capacity)
+            ring = CandleRing(self.capacity)
+            if len(data) < self.capacity:
+                self._complete.add(key)
+            else:
+                self._complete.discard(key)
+        now_ms = time.time() * 1000
+        for c in data:
+            if c[6] < now_ms:  # candela chiusa
+                ring.push(*_row(c))
+            else:
+                self._open[key] = (_row(c), now_ms)
+        if key not in self._rings:
+            self._make_room()
+        self._rings[key] = ring
+        self._rings.move_to_end(key)
+
+    def update(self, symbol: str, interval: str, k: dict):
+        """Candela dallo stream live (dict t/o/h/l/c/v/x), solo per le chiavi già caricate"""
+        key = (symbol, interval)
+        ring = self._rings.get(key)
+        if ring is None:
+            return
+        self._streamed[key] = time.time() * 1000
+        candle = (k["t"], float(k["o"]), float(k["h"]), float(k["l"]), float(k["c"]), float(k["v"]))
+        if not k["x"]:
+            self._open[key] = (candle, time.time() * 1000)
+            return
+        if len(ring) and k["t"] > ring.last_t + interval_ms(interval):
+            # buco (stream riconnesso): al prossimo uso la chiave viene ricaricata
+            self._drop(key)
+            return
+        ring.push(*candle)
+        last = self._open.get(key)
+        if last is not None and last[0][0] <= k["t"]:
+            del self._open[key]
+
+    def stats(self) -> dict:
+        return {
+            "series": len(self._rings),
+            "evictions": self.evictions,
+            "hits": self.hits,
+            "fetches": self.fetches,
+            "topups": self.topups,
+            "fallbacks": self.fallbacks,
+            "coalesced": self._flights.coalesced,
+        }
+
+
+# store condiviso dal processo
+store = CandleStore()
@@ -0,0 +1,44 @@
+# Politiche di valutazione per /ws/signals: decidono quando un aggiornamento
+# kline deve rieseguire features + predizione per un client. Gli
+# aggiornamenti non valutati inviano solo il nuovo prezzo.
+# La chiusura di una candela provoca sempre una valutazione.
+
+MODES = ("tick", "close", "debounce", "change")
+
+
+class EvalPolicy:
+    """Modalità di valutazione di un client:
+    tick     → ogni messaggio (comportamento storico)
+    close    → solo alla chiusura della candela
+    debounce → al massimo una valutazione ogni debounce_ms
+    change   → quando il prezzo varia più di threshold (relativo) dall'ultima valutazione
+    """
+
+    __slots__ = ("mode", "debounce", "threshold", "last_eval", "last_price")
+
+    def __init__(self, mode: str = "tick", debounce_ms: int = 1000, threshold: float = 0.001):
+        if mode not in MODES:
+            raise ValueError(f"modalità non valida: {mode} (ammesse: {', '.join(MODES)})")
+        if debounce_ms < 0 or threshold < 0:
+            raise ValueError("debounce_ms e threshold devono essere >= 0")
+        self.mode = mode
+        self.debounce = debounce_ms / 1000.0
+        self.threshold = threshold
+        self.last_eval = None
+        self.last_price = None
+
+    def due(self, price: float, closed: bool, now: float) -> bool:
+        if self.mode == "tick" or closed or self.last_eval is None:
+            return True
+        if self.mode == "debounce":
+            return now - self.last_eval >= self.debounce
+        if self.mode == "change":
+            return abs(price - self.last_price) >= self.threshold * abs(self.last_price)
+        return False  # close: candela ancora aperta
+
+    def mark(self, price: float, now: float):
+        self.last_eval = now
+        self.last_price = price
+
+    def __repr__(self):
+        return f"EvalPolicy({self.mode})"
@@ -0,0 +1,151 @@
+import asyncio
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from . import ai_utils
+from .tree_eval import compiled_for
+from .settings import (
+    INFERENCE_COMPILED, INFERENCE_COMPILED_MAX_ROWS,
+    EXECUTOR_KIND, EXECUTOR_WORKERS, EXECUTOR_MAX_QUEUE, EXECUTOR_TIMEOUT,
+)
+
+# Esecuzione del lavoro CPU-bound (predict_proba) fuori dall'event loop, così
+# una predizione lenta non blocca heartbeat e fan-out degli altri WebSocket.
+# "thread"  → pool di thread che condividono i modelli del processo
+# "process" → pool di processi, ogni worker ha i suoi modelli già caricati
+
+
+class ExecutorBusy(Exception):
+    """Coda piena: il lavoro viene rifiutato invece di accumulare ritardo"""
+
+
+# ------------------ Lato worker ------------------
+
+_worker_version = None
+
+
+def _init_worker():
+    # l'import di ai_utils carica i modelli: fatto una volta per worker
+    global _worker_version
+    _worker_version = ai_utils.model_version
+
+
+def predict_rows(model_key: str, rows: list, version: int = None):
+    """predict_proba su più righe di FEATURE_COLUMNS (eseguita nel worker)"""
+    global _worker_version
+    if version is not None and _worker_version is not None and version != _worker_version:
+        ai_utils.reload_models()  # il processo principale ha ricaricato i modelli
+        _worker_version = version
+    model = ai_utils.models[model_key]
+    if INFERENCE_COMPILED and len(rows) <= INFERENCE_COMPILED_MAX_ROWS:
+        compiled = compiled_for(model_key, model, len(ai_utils.FEATURE_COLUMNS))
+        if compiled is not None:
+            return compiled.predict_proba(rows)
+    return model.predict_proba(pd.DataFrame(rows, columns=ai_utils.FEATURE_COLUMNS))
+
+
+def predict_series(model_key: str, closes: list, last: int = None, version: int = None):
+    """Feature vettoriali sull'intera finestra di chiusure e predict_proba delle
+    ultime `last` righe (eseguita nel worker); restituisce (proba, warmup)"""
+    df = ai_utils.compute_features(pd.DataFrame({"close": np.asarray(closes, dtype=np.float64)}))
+    features = df[ai_utils.FEATURE_COLUMNS]
+    if last is not None:
+        features = features.iloc[-last:]
+    warmup = int(features.isna().any(axis=1).sum())
+    rows = features.fillna(0).values.tolist()
+    return np.asarray(predict_rows(model_key, rows, version)), warmup
+
+
+def predict_many(series: list, version: int = None) -> list:
+    """predict_series per più serie (model_key, closes, last) in un solo job"""
+    return [predict_series(model_key, closes, last, version) for model_key, closes, last in series]
+
+
+# ------------------ Lato event loop ------------------
+
+class CpuExecutor:
+    """Pool per lavoro CPU-bound con coda limitata e timeout per job"""
+
+    def __init__(self, kind: str = EXECUTOR_KIND, workers: int = EXECUTOR_WORKERS,
+                 max_queue: int = EXECUTOR_MAX_QUEUE, timeout: float = EXECUTOR_TIMEOUT):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"executor non valido: {kind} (thread | process)")
+        self.kind = kind
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._pool = None
+        self.pending = 0
+        # metriche
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    def _get_pool(self):
+        if self._pool is None:
+            if self.kind == "process":
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="cpu")
+        return self._pool
+
+    def _release(self):
+        self.pending -= 1
+
+    def _job_done(self, loop, _job):
+        # chiamata dal thread del pool: pending si aggiorna nell'event loop
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            pass  # loop già chiuso (shutdown)
+
+    async def run(self, fn, *args):
+        """Esegue fn(*args) nel pool; ExecutorBusy se la coda è piena,
+        asyncio.TimeoutError se il job supera il timeout"""
+        if self.pending >= self.max_queue:
+            self.rejected += 1
+            raise ExecutorBusy(f"coda executor piena ({self.max_queue} job)")
+        loop = asyncio.get_running_loop()
+        job = self._get_pool().submit(fn, *args)
+        self.pending += 1
+        # il posto in coda si libera quando il job termina davvero: il timeout
+        # interrompe solo l'attesa del chiamante, non il lavoro già nel pool
+        job.add_done_callback(partial(self._job_done, loop))
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(job), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        self.completed += 1
+        return result
+
+    async def predict(self, model_key: str, rows: list):
+        # nel pool di processi i worker confrontano la versione e ricaricano se serve
+        version = ai_utils.model_version if self.kind == "process" else None
+        return await self.run(predict_rows, model_key, rows, version)
+
+    async def predict_series(self, series: list):
+        """Serie (model_key, closes, last) valutate in un unico job: una richiesta
+        occupa un solo posto in coda qualunque sia il numero di serie"""
+        version = ai_utils.model_version if self.kind == "process" else None
+        return await self.run(predict_many, series, version)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+        }
+
+
+# executor condiviso dal processo
+executor = CpuExecutor()
@@ -0,0 +1,191 @@
+import math
+from collections import deque
+
+# Indicatori incrementali O(1) per candela, equivalenti a compute_features()
+# di ai_utils (libreria ta) calcolato sull'intera storia delle candele chiuse.
+# Ogni indicatore ha due operazioni:
+#   peek(x) -> valore con la candela in corso a prezzo x, senza modificare lo stato
+#   push(x) -> registra la candela chiusa a prezzo x e restituisce il valore
+
+NAN = float("nan")
+# candele chiuse necessarie all'indicatore più lento (EMA50; il segnale MACD ne usa 34)
+WARMUP_CANDLES = 50
+
+
+class Ema:
+    """EMA con adjust=False e min_periods come ta._ema / pandas ewm"""
+
+    __slots__ = ("alpha", "min_periods", "value", "count")
+
+    def __init__(self, span: int = None, alpha: float = None, min_periods: int = None):
+        self.alpha = alpha if alpha is not None else 2.0 / (span + 1)
+        self.min_periods = min_periods if min_periods is not None else (span or 0)
+        self.value = None
+        self.count = 0
+
+    def _next(self, x: float) -> float:
+        if self.value is None:
+            return x
+        return self.value + self.alpha * (x - self.value)
+
+    def _out(self, value: float, count: int) -> float:
+        return value if count >= self.min_periods else NAN
+
+    def peek(self, x: float) -> float:
+        return self._out(self._next(x), self.count + 1)
+
+    def push(self, x: float) -> float:
+        self.value = self._next(x)
+        self.count += 1
+        return self._out(self.value, self.count)
+
+
+class Sma:
+    """Media mobile semplice (rolling(window).mean()) con somma corrente"""
+
+    __slots__ = ("window", "values", "total")
+
+    def __init__(self, window: int):
+        self.window = window
+        self.values = deque(maxlen=window - 1)  # ultime window-1 chiusure
+        self.total = 0.0
+
+    def peek(self, x: float) -> float:
+        if len(self.values) < self.window - 1:
+            return NAN
+        return (self.total + x) / self.window
+
+    def push(self, x: float) -> float:
+        value = self.peek(x)
+        if len(self.values) == self.values.maxlen:
+            self.total -= self.values[0]
+        self.values.append(x)
+        self.total += x
+        return value
+
+
+class Rsi:
+    """RSI di Wilder come ta.momentum.RSIIndicator (fillna=False)"""
+
+    __slots__ = ("prev", "up", "down")
+
+    def __init__(self, window: int = 14):
+        self.prev = None
+        self.up = Ema(alpha=1.0 / window, min_periods=window)
+        self.down = Ema(alpha=1.0 / window, min_periods=window)
+
+    def _moves(self, x: float):
+        # come ta: la prima differenza (NaN) conta come movimento nullo
+        diff = 0.0 if self.prev is None else x - self.prev
+        return (diff if diff > 0 else 0.0), (-diff if diff < 0 else 0.0)
+
+    @staticmethod
+    def _rsi(up: float, down: float) -> float:
+        if down == 0:
+            return 100.0
+        if math.isnan(up) or math.isnan(down):
+            return NAN
+        return 100.0 - 100.0 / (1.0 + up / down)
+
+    def peek(self, x: float) -> float:
+        up, down = self._moves(x)
+        return self._rsi(self.up.peek(up), self.down.peek(down))
+
+    def push(self, x: float) -> float:
+        up, down = self._moves(x)
+        self.prev = x
+        return self._rsi(self.up.push(up), self.down.push(down))
+
+
+class Macd:
+    """MACD come ta.trend.MACD: la signal parte dal primo valore MACD valido"""
+
+    __slots__ = ("fast", "slow", "signal")
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        self.fast = Ema(span=fast)
+        self.slow = Ema(span=slow)
+        self.signal = Ema(span=signal)
+
+    def _result(self, macd: float, signal: float):
+        return macd, signal, macd - signal
+
+    def peek(self, x: float):
+        macd = self.fast.peek(x) - self.slow.peek(x)
+        if math.isnan(macd):
+            return NAN, NAN, NAN
+        return self._result(macd, self.signal.peek(macd))
+
+    def push(self, x: float):
+        macd = self.fast.push(x) - self.slow.push(x)
+        if math.isnan(macd):
+            return NAN, NAN, NAN
+        return self._result(macd, self.signal.push(macd))
+
+
+class StreamingFeatures:
+    """Stato incrementale delle feature del modello per un simbolo.
+
+    Le candele chiuse aggiornano lo stato, gli aggiornamenti della candela
+    in corso (k['x'] falso) calcolano i valori senza modificarlo. Se la
+    chiusura di una candela non arriva (es. riconnessione) l'ultimo prezzo
+    visto viene consolidato all'apertura della candela successiva.
+    """
+
+    def __init__(self):
+        self.rsi = Rsi(14)
+        self.ema20 = Ema(span=20)
+        self.ema50 = Ema(span=50)
+        self.macd = Macd(12, 26, 9)
+        self.ma5 = Sma(5)
+        self.ma20 = Sma(20)
+        self.last_closed_t = None  # open time dell'ultima candela chiusa
+        self.pending = None  # (open time, close) della candela in corso
+        self.closed_count = 0
+        self.last = None  # ultime feature calcolate
+
+    def _row(self, close: float, step: str) -> dict:
+        macd, macd_signal, macd_diff = getattr(self.macd, step)(close)
+        return {
+            "close": close,
+            "rsi": getattr(self.rsi, step)(close),
+            "ema20": getattr(self.ema20, step)(close),
+            "ema50": getattr(self.ema50, step)(close),
+            "macd": macd,
+            "macd_signal": macd_signal,
+            "macd_diff": macd_diff,
+            "ma5": getattr(self.ma5, step)(close),
+            "ma20": getattr(self.ma20, step)(close),
+        }
+
+    def _commit(self, close: float, t) -> dict:
+        self.last_closed_t = t
+        self.pending = None
+        self.closed_count += 1
+        return self._row(close, "push")
+
+    def seed(self, closes, times=None):
+        """Inizializza lo stato con la storia di candele chiuse"""
+        for i, close in enumerate(closes):
+            self.last = self._commit(float(close), times[i] if times is not None else None)
+        return self.last
+
+    def update(self, close: float, closed: bool, t=None) -> dict:
+        """Aggiorna con un messaggio kline e restituisce le feature correnti"""
+        if t is not None and self.last_closed_t is not None and t <= self.last_closed_t:
+            return self.last  # candela già consolidata (messaggio duplicato o in ritardo)
+
+        if self.pending is not None and t is not None and self.pending[0] != t:
+            self._commit(self.pending[1], self.pending[0])
+
+        if closed:
+            self.last = self._commit(close, t)
+        else:
+            self.pending = (t, close)
+            self.last = self._row(close, "peek")
+        return self.last
+
+    @property
+    def ready(self) -> bool:
+        """True quando anche la MA20 è disponibile (stesso requisito di prima)"""
+        return self.last is not None and not math.isnan(self.last["ma20"])
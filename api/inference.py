@@ -0,0 +1,125 @@
+import asyncio
+import time
+import numpy as np
+from . import ai_utils
+from .executor import executor
+from .prediction_cache import cache
+from .metrics import registry, SIZE_BUCKETS
+from .settings import INFERENCE_BATCH_WINDOW_MS, INFERENCE_MAX_BATCH
+
+# Micro-batching delle predizioni: le righe di feature dei simboli che
+# condividono lo stesso modello vengono raccolte per una finestra breve
+# (es. 5 ms) e valutate con una sola chiamata predict_proba, poi ogni
+# risultato torna al chiamante che lo ha richiesto. La chiamata gira
+# nell'executor CPU, fuori dall'event loop.
+
+
+class _Batch:
+    __slots__ = ("model_key", "rows", "futures", "enqueued", "timer")
+
+    def __init__(self, model_key: str):
+        self.model_key = model_key
+        self.rows = []
+        self.futures = []
+        self.enqueued = []
+        self.timer = None
+
+
+class BatchScheduler:
+    """Raccoglie le richieste per modello e le valuta in un'unica chiamata"""
+
+    def __init__(self, window_ms: float = INFERENCE_BATCH_WINDOW_MS, max_batch: int = INFERENCE_MAX_BATCH):
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._pending = {}  # chiave modello -> _Batch in raccolta
+        self._running = set()  # task dei batch in valutazione (riferimento forte fino alla fine)
+        # metriche
+        self.batches = 0
+        self.rows = 0
+        self.max_batch_seen = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.errors = 0
+        self.size_hist = registry.histogram(
+            "inference_batch_size", "Righe per chiamata predict_proba", buckets=SIZE_BUCKETS)
+        self.wait_hist = registry.histogram(
+            "inference_queue_wait_seconds", "Attesa di una riga prima della valutazione del batch")
+
+    async def predict(self, model_key: str, row) -> np.ndarray:
+        """Probabilità delle classi per una riga di FEATURE_COLUMNS"""
+        if cache.enabled:
+            key = cache.key(model_key, row)
+            proba = cache.get(key)
+            if proba is not None:
+                return proba
+            version = ai_utils.model_version
+            proba = await self._enqueue(model_key, row)
+            cache.put(key, proba, version)
+            return proba
+        return await self._enqueue(model_key, row)
+
+    async def _enqueue(self, model_key: str, row) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._pending.get(model_key)
+        if batch is None:
+            batch = self._pending[model_key] = _Batch(model_key)
+            batch.timer = loop.call_later(self.window, self._flush, model_key)
+        batch.rows.append(row)
+        batch.futures.append(future)
+        batch.enqueued.append(time.perf_counter())
+        if len(batch.rows) >= self.max_batch:
+            batch.timer.cancel()
+            self._flush(model_key)
+        return await future
+
+    def _flush(self, model_key: str):
+        batch = self._pending.pop(model_key, None)
+        if batch is not None:
+            task = asyncio.ensure_future(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: _Batch):
+        started = time.perf_counter()
+        try:
+            proba = await executor.predict(batch.model_key, batch.rows)
+        except Exception as e:
+            self.errors += 1
+            for future in batch.futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, p in zip(batch.futures, proba):
+            if not future.done():  # il chiamante potrebbe essere stato cancellato
+                future.set_result(p)
+        self._record(batch, started)
+
+    def _record(self, batch: _Batch, started: float):
+        size = len(batch.rows)
+        self.batches += 1
+        self.rows += size
+        self.max_batch_seen = max(self.max_batch_seen, size)
+        self.size_hist.observe(size)
+        for enqueued in batch.enqueued:
+            wait = started - enqueued
+            self.wait_hist.observe(wait)
+            self.wait_total += wait
+            if wait > self.wait_max:
+                self.wait_max = wait
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "avg_batch_size": round(self.rows / self.batches, 2) if self.batches else 0.0,
+            "max_batch_size": self.max_batch_seen,
+            "avg_queue_wait_ms": round(self.wait_total / self.rows * 1000, 3) if self.rows else 0.0,
+            "max_queue_wait_ms": round(self.wait_max * 1000, 3),
+            "errors": self.errors,
+            "pending": sum(len(b.rows) for b in self._pending.values()),
+        }
+
+
+# scheduler condiviso da tutte le pipeline del processo
+scheduler = BatchScheduler()
@@ -0,0 +1,17 @@
+# Durata in millisecondi degli intervalli kline di Binance
+
+_UNIT_MS = {"s": 1000, "m": 60_000, "h": 3_600_000, "d": 86_400_000, "w": 604_800_000}
+
+
+def interval_ms(interval: str) -> int:
+    """"1s" → 1000, "5m" → 300000, ... ("1M" approssimato a 30 giorni)"""
+    if interval.endswith("M"):
+        return int(interval[:-1]) * 30 * _UNIT_MS["d"]
+    try:
+        return int(interval[:-1]) * _UNIT_MS[interval[-1]]
+    except (KeyError, ValueError):
+        raise ValueError(f"intervallo non valido: {interval}")
+
+
+# intervalli accettati dagli stream kline di Binance
+KLINE_INTERVALS = ("1s", "1m", "3m", "5m", "15m", "30m", "1h", "2h", "4h", "6h", "8h", "12h", "1d", "3d", "1w", "1M")
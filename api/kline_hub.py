@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import time
+from .binance_clients import get_socket_manager
+from .rest_client import rest
+from .weight_budget import REALTIME, BULK
+from .intervals import KLINE_INTERVALS
+from .resampler import Resampler, can_resample
+from .candle_store import store
+from .settings import CANDLES_RESAMPLE, RESAMPLE_SEED_PAGES
+from .wire import Frame
+from .metrics import messages_counter, upstream_connected
+
+log = logging.getLogger(__name__)
+
+# Hub degli stream kline per /ws/candles1s: un solo stream Binance per
+# (simbolo, intervallo) indipendentemente da quanti client e quante schede
+# lo osservano. Ogni candela diventa un Frame condiviso, accodato senza
+# attese nelle OutboundQueue dei client iscritti. Gli intervalli che Binance
+# non offre (5s, 15s, ...) e, con CANDLES_RESAMPLE, anche quelli nativi in
+# s/m/h sono aggregati dallo stream da 1s del simbolo: nessuno stream in più
+# per ogni timeframe aggiuntivo.
+
+RETRY_SECONDS = (1, 2, 5, 10, 30)  # attese tra i tentativi di riconnessione upstream
+
+
+def stream_key(symbol: str, interval: str) -> str:
+    return f"{symbol}@{interval}"
+
+
+def resampled(interval: str) -> bool:
+    """True se l'intervallo viene costruito dallo stream da 1s"""
+    if not can_resample(interval):
+        return False
+    return CANDLES_RESAMPLE or interval not in KLINE_INTERVALS
+
+
+def candle_from_kline(k: dict) -> dict:
+    return {
+        "t": k["t"],         # timestamp in ms
+        "s": k["s"],         # symbol
+        "i": k["i"],         # intervallo
+        "o": float(k["o"]),  # open
+        "h": float(k["h"]),  # high
+        "l": float(k["l"]),  # low
+        "c": float(k["c"]),  # close
+        "v": float(k["v"]),  # volume
+        "x": k["x"],         # is closed
+    }
+
+
+class KlineFeed:
+    """Uno stream upstream condiviso e le code dei client iscritti"""
+
+    def __init__(self, symbol: str, interval: str):
+        self.symbol = symbol
+        self.interval = interval
+        self.key = stream_key(symbol, interval)
+        self.subscribers = set()  # OutboundQueue
+        self.task = None
+        self.last_frame = None  # ultima candela, inviata subito ai nuovi iscritti
+        self.derived = {}  # solo stream da 1s: intervallo -> KlineFeed aggregato
+        self.resampler = None  # solo stream aggregati
+
+    def publish(self, frame: Frame):
+        # conflate: degli aggiornamenti della stessa candela resta l'ultimo
+        for queue in list(self.subscribers):
+            queue.put(frame, (self.key, frame.payload["t"]))
+
+
+class KlineHub:
+    """Avvia lo stream di (simbolo, intervallo) al primo iscritto e lo ferma dopo l'ultimo"""
+
+    def __init__(self, endpoint: str = "candles1s"):
+        self.endpoint = endpoint  # etichetta delle metriche
+        self.feeds = {}
+        self._lock = asyncio.Lock()
+
+    def _acquire(self, symbol: str, interval: str) -> KlineFeed:
+        """Feed di (simbolo, intervallo), creato e avviato se manca (sotto lock)"""
+        key = stream_key(symbol, interval)
+        feed = self.feeds.get(key)
+        if feed is None:
+            feed = self.feeds[key] = KlineFeed(symbol, interval)
+            if resampled(interval):
+                source = self._acquire(symbol, "1s")
+                feed.resampler = Resampler(symbol, interval)
+                source.derived[interval] = feed
+                feed.task = asyncio.create_task(self._seed(feed))
+                log.info("Stream kline aggregato da 1s", extra={"symbol": symbol, "interval": interval})
+            else:
+                feed.task = asyncio.create_task(self._run(feed))
+                log.info("Stream kline avviato", extra={"symbol": symbol, "interval": interval})
+        return feed
+
+    def _release(self, feed: KlineFeed, tasks: list):
+        """Rimuove il feed se nessuno lo usa più (sotto lock); i task da fermare finiscono in `tasks`"""
+        if feed.subscribers or feed.derived or self.feeds.get(feed.key) is not feed:
+            return
+        del self.feeds[feed.key]
+        if feed.task is not None:
+            tasks.append(feed.task)
+        if feed.resampler is not None:
+            source = self.feeds.get(stream_key(feed.symbol, "1s"))
+            if source is not None:
+                source.derived.pop(feed.interval, None)
+                self._release(source, tasks)
+
+    async def subscribe(self, symbol: str, interval: str, queue) -> KlineFeed:
+        async with self._lock:
+            feed = self._acquire(symbol, interval)
+            if feed.last_frame is not None:
+                queue.put(feed.last_frame, (feed.key, feed.last_frame.payload["t"]))
+            feed.subscribers.add(queue)
+        return feed
+
+    async def unsubscribe(self, symbol: str, interval: str, queue):
+        tasks = []
+        async with self._lock:
+            feed = self.feeds.get(stream_key(symbol, interval))
+            if feed is None:
+                return
+            feed.subscribers.discard(queue)
+            self._release(feed, tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if tasks:
+            log.info("Stream kline fermato (nessun iscritto)", extra={"symbol": symbol, "interval": interval})
+
+    async def _seed(self, feed: KlineFeed):
+        """Secondi già trascorsi della barra corrente, così la prima barra non parte a metà"""
+        try:
+            now_ms = int(time.time() * 1000)
+            start = now_ms - now_ms % feed.resampler.ms
+            # pagine successive (1000 secondi l'una) fino al primo secondo live o ad adesso
+            rows = []
+            since = start
+            for page in range(RESAMPLE_SEED_PAGES):
+                data = await rest.klines(feed.symbol, "1s", 1000, REALTIME if page == 0 else BULK, startTime=since)
+                rows += data
+                if len(data) < 1000:
+                    break
+                since = data[-1][0] + 1000
+                first_live = feed.resampler.first_live
+                if since >= now_ms or (first_live is not None and since >= first_live):
+                    break
+            feed.resampler.seed([
+                {"t": r[0], "o": float(r[1]), "h": float(r[2]), "l": float(r[3]), "c": float(r[4]), "v": float(r[5])}
+                for r in rows
+            ], now_ms)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("Seed barra %s non riuscito, la prima barra sarà parziale: %s", feed.key, e)
+
+    async def _run(self, feed: KlineFeed):
+        m_messages = messages_counter(self.endpoint, feed.symbol)
+        attempt = 0
+        while True:
+            try:
+                bsm = await get_socket_manager()
+                async with bsm.kline_socket(symbol=feed.symbol.lower(), interval=feed.interval) as stream:
+                    upstream_connected(self.endpoint, feed.symbol)
+                    attempt = 0
+                    while True:
+                        msg = await stream.recv()
+                        m_messages.inc()
+                        if msg and "k" in msg:
+                            candle = candle_from_kline(msg["k"])
+                            frame = Frame(candle, "candle", key=feed.key)
+                            feed.last_frame = frame
+                            feed.publish(frame)
+                            store.update(feed.symbol, feed.interval, candle)  # /candles dalla memoria
+                            for derived in list(feed.derived.values()):
+                                for bar in derived.resampler.update(candle):
+                                    frame = Frame(bar, "candle", key=derived.key)
+                                    derived.last_frame = frame
+                                    derived.publish(frame)
+                                    if not bar["p"]:  # le barre parziali non finiscono in /candles
+                                        store.update(feed.symbol, derived.interval, bar)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # un errore upstream non chiude i client: lo stream viene riaperto
+                delay = RETRY_SECONDS[min(attempt, len(RETRY_SECONDS) - 1)]
+                attempt += 1
+                log.warning("Errore stream kline, riprovo tra %ds: %s", delay, e, extra={"stream": feed.key})
+                await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        return {key: len(feed.subscribers) for key, feed in self.feeds.items()}
+
+
+# hub condiviso dal processo
+hub = KlineHub()
@@ -0,0 +1,95 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+from .settings import LOG_LEVEL, LOG_FORMAT, LOG_SAMPLE_SECONDS
+
+# Logging strutturato dell'API: i moduli usano logging.getLogger(__name__),
+# il logger "api" accoda i record (QueueHandler) e un thread di background
+# (QueueListener) li formatta e li scrive, così l'event loop non attende mai
+# il terminale o la pipe. Gli eventi per-tick passano da debug_sampled().
+
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+_listener = None
+
+
+def _extras(record: logging.LogRecord) -> dict:
+    """Campi strutturati passati con extra={...}"""
+    return {k: v for k, v in vars(record).items() if k not in _STANDARD_ATTRS}
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s: %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        extras = _extras(record)
+        if extras:
+            line += " " + " ".join(f"{k}={v}" for k, v in extras.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **_extras(record),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def setup_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT):
+    """Configura il logger "api" con scrittura in background (idempotente)"""
+    global _listener
+    if _listener is not None:
+        return
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    records = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(records, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    logger = logging.getLogger("api")
+    logger.setLevel(level.upper())
+    logger.addHandler(logging.handlers.QueueHandler(records))
+    logger.propagate = False
+
+
+class RateLimiter:
+    """Lascia passare al massimo un evento per chiave ogni `interval` secondi"""
+
+    def __init__(self, interval: float = LOG_SAMPLE_SECONDS):
+        self.interval = interval
+        self._last = {}  # chiave -> (istante ultimo evento, eventi soppressi)
+
+    def allow(self, key):
+        """None se l'evento va scartato, altrimenti il numero di eventi soppressi da prima"""
+        now = time.monotonic()
+        last, suppressed = self._last.get(key, (0.0, 0))
+        if now - last < self.interval:
+            self._last[key] = (last, suppressed + 1)
+            return None
+        self._last[key] = (now, 0)
+        return suppressed
+
+
+_sampler = RateLimiter()
+
+
+def debug_sampled(logger: logging.Logger, key, msg: str, *args, **extra):
+    """Debug campionato per eventi per-tick: nessun costo se DEBUG è disattivo"""
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    suppressed = _sampler.allow(key)
+    if suppressed is not None:
+        logger.debug(msg, *args, extra={**extra, "suppressed": suppressed})
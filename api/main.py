@@ -1,13 +1,23 @@
 from fastapi import FastAPI
+from .log import setup_logging
+
+# logging in background configurato prima di importare i moduli che loggano
+setup_logging()
+
 from fastapi.middleware.cors import CORSMiddleware  # 👈 AGGIUNGI QUESTA IMPORT
 from .ws_candles import router as candles_router
 from .ws_tickers import register_ws_tickers
-from .ws_signals import router as signals_router
+from .ws_signals import router as signals_router, journal
 from .routes_orders import router as orders_router
 from .routes_tickers import router as tickers_router
 from .routes_predict import router as predict_router
+from .routes_sessions import router as sessions_router
 from .routes_status import router as status_router
 from .routes_candles import router as candles_rest_router
+from .routes_metrics import router as metrics_router
+from .binance_clients import close_clients
+from .rest_client import rest
+from .executor import executor
 
 app = FastAPI()
 
@@ -28,11 +38,24 @@ app.include_router(signals_router)
 app.include_router(orders_router)
 app.include_router(tickers_router)
 app.include_router(predict_router)
+app.include_router(sessions_router)
 app.include_router(status_router)
 app.include_router(candles_rest_router)
+app.include_router(metrics_router)
 
 # Funzioni che non usano router
 register_ws_tickers(app)
+
+
+@app.on_event("shutdown")
+async def shutdown_clients():
+    # chiude il client Binance condiviso dagli stream, la sessione REST,
+    # il pool CPU e scrive gli ordini ancora in coda
+    await close_clients()
+    await rest.close()
+    executor.shutdown()
+    journal.close()
+
 # Aggiungi anche un endpoint di test per verificare CORS
 @app.get("/test-cors")
 async def test_cors():
@@ -0,0 +1,189 @@
+from bisect import bisect_left
+
+# Metriche della pipeline realtime in formato testo Prometheus.
+# Gli oggetti vengono aggiornati solo dal thread dell'event loop (un solo
+# scrittore), quindi non servono lock: un'osservazione di istogramma è una
+# bisect su ~20 limiti più due somme, ben sotto il microsecondo.
+
+# limiti per le dimensioni dei batch di inferenza
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+# limiti in secondi: da 10 µs a 10 s
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, n: int = 1):
+        self.value += n
+
+
+class Gauge:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, n: int = 1):
+        self.value += n
+
+    def dec(self, n: int = 1):
+        self.value -= n
+
+    def set(self, value):
+        self.value = value
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # l'ultimo è +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+class Registry:
+    """Metriche etichettate; gli oggetti restituiti vanno conservati dal chiamante"""
+
+    def __init__(self):
+        self._families = {}  # nome -> [tipo, help, {chiave etichette: (etichette, oggetto)}]
+        self._collectors = []  # funzioni valutate a ogni scrape
+
+    def _get(self, kind: str, factory, name: str, help_text: str, labels: dict):
+        family = self._families.setdefault(name, [kind, help_text, {}])
+        key = tuple(sorted(labels.items()))
+        entry = family[2].get(key)
+        if entry is None:
+            entry = family[2][key] = (labels, factory())
+        return entry[1]
+
+    def counter(self, name: str, help_text: str = "", **labels) -> Counter:
+        return self._get("counter", Counter, name, help_text, labels)
+
+    def gauge(self, name: str, help_text: str = "", **labels) -> Gauge:
+        return self._get("gauge", Gauge, name, help_text, labels)
+
+    def histogram(self, name: str, help_text: str = "", buckets=LATENCY_BUCKETS, **labels) -> Histogram:
+        return self._get("histogram", lambda: Histogram(buckets), name, help_text, labels)
+
+    def register_collector(self, fn):
+        """fn() -> lista di (nome, tipo, help, etichette, valore) calcolati allo scrape"""
+        self._collectors.append(fn)
+
+    def render(self) -> str:
+        lines = []
+        for name, (kind, help_text, series) in self._families.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, metric in series.values():
+                if kind == "histogram":
+                    cumulative = 0
+                    for bound, count in zip(metric.bounds + (float("inf"),), metric.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{name}_bucket{_labels({**labels, 'le': le})} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(labels)} {metric.sum}")
+                    lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+                else:
+                    lines.append(f"{name}{_labels(labels)} {metric.value}")
+        seen = set()
+        for collector in self._collectors:
+            for name, kind, help_text, labels, value in collector():
+                if name not in seen:
+                    seen.add(name)
+                    lines.append(f"# HELP {name} {help_text}")
+                    lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# registro condiviso dal processo
+registry = Registry()
+
+
+# ------------------ Metriche comuni agli endpoint realtime ------------------
+
+# Il simbolo arriva dalle query string dei client: come etichetta valgono solo
+# i simboli noti (modelli caricati, universo del feed ticker, "ALL"), tutti
+# gli altri finiscono in "other" così un client non può far crescere a
+# piacere il numero di serie esportate.
+OTHER_SYMBOL = "other"
+_known_symbols = {"ALL"}
+
+
+def allow_symbols(symbols):
+    """Aggiunge simboli ammessi come etichetta"""
+    _known_symbols.update(s.upper() for s in symbols)
+
+
+def symbol_label(symbol: str) -> str:
+    return symbol if symbol in _known_symbols else OTHER_SYMBOL
+
+
+def stage_histogram(stage: str, endpoint: str, symbol: str) -> Histogram:
+    return registry.histogram(
+        "pipeline_stage_seconds", "Durata per stadio della pipeline realtime",
+        stage=stage, endpoint=endpoint, symbol=symbol_label(symbol),
+    )
+
+
+def messages_counter(endpoint: str, symbol: str) -> Counter:
+    return registry.counter("upstream_messages_total", "Messaggi ricevuti da Binance", endpoint=endpoint, symbol=symbol_label(symbol))
+
+
+def sent_counter(endpoint: str, symbol: str) -> Counter:
+    return registry.counter("ws_messages_sent_total", "Messaggi inviati ai client", endpoint=endpoint, symbol=symbol_label(symbol))
+
+
+def bytes_counter(endpoint: str, symbol: str) -> Counter:
+    # caratteri per i frame di testo, prima dell'eventuale permessage-deflate
+    return registry.counter("ws_bytes_sent_total", "Byte dei payload inviati ai client", endpoint=endpoint, symbol=symbol_label(symbol))
+
+
+def drops_counter(endpoint: str, symbol: str) -> Counter:
+    return registry.counter("ws_messages_dropped_total", "Messaggi scartati per client lenti", endpoint=endpoint, symbol=symbol_label(symbol))
+
+
+def slow_disconnects_counter(endpoint: str, symbol: str) -> Counter:
+    return registry.counter(
+        "ws_slow_disconnects_total", "Client disconnessi perché rimasti indietro",
+        endpoint=endpoint, symbol=symbol_label(symbol),
+    )
+
+
+_connected = set()
+
+
+def upstream_connected(endpoint: str, symbol: str):
+    """Da chiamare a ogni apertura di uno stream upstream: dalla seconda conta come riconnessione"""
+    symbol = symbol_label(symbol)
+    key = (endpoint, symbol)
+    if key in _connected:
+        registry.counter(
+            "upstream_reconnects_total", "Stream upstream riaperti dopo il primo",
+            endpoint=endpoint, symbol=symbol,
+        ).inc()
+    _connected.add(key)
+
+
+def connections_gauge(endpoint: str, symbol: str) -> Gauge:
+    return registry.gauge("ws_active_connections", "Client WebSocket connessi", endpoint=endpoint, symbol=symbol_label(symbol))
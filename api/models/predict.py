@@ -0,0 +1,45 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+class CandleSeries(BaseModel):
+    # candele in colonne (dalla più vecchia alla più recente); le feature usano solo "c"
+    symbol: str
+    c: List[float]
+    t: Optional[List[int]] = None
+    o: Optional[List[float]] = None
+    h: Optional[List[float]] = None
+    l: Optional[List[float]] = None
+    v: Optional[List[float]] = None
+    last: Optional[int] = None  # solo le ultime N righe (default: tutte)
+
+class BatchPredictRequest(BaseModel):
+    series: List[CandleSeries]
+
+class SeriesPrediction(BaseModel):
+    symbol: str
+    model: str
+    warmup: int  # righe iniziali con indicatori incompleti (valutate con 0, come in training)
+    t: Optional[List[int]] = None
+    signal: List[str]
+    confidence: List[float]
+    probs: List[List[float]]
+
+class BatchPredictResponse(BaseModel):
+    labels: List[str]
+    series: List[SeriesPrediction]
+
+class SessionCandle(BaseModel):
+    t: int
+    c: float
+    o: Optional[float] = None
+    h: Optional[float] = None
+    l: Optional[float] = None
+    v: float = 0.0
+    x: bool = True  # False = candela ancora in corso
+
+class CreateSessionRequest(BaseModel):
+    symbol: str
+    candles: List[SessionCandle] = []
+
+class PushCandlesRequest(BaseModel):
+    candles: List[SessionCandle]
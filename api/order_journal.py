@@ -0,0 +1,129 @@
+import json
+import os
+import pathlib
+import queue
+import threading
+import time
+from collections import deque
+from .settings import ORDERS_KEEP, ORDERS_FSYNC_MS, ORDERS_COMPACT_EVERY
+
+# Journal append-only degli ordini simulati: un ordine JSON per riga.
+# L'event loop accoda soltanto; un thread di background scrive i record in
+# gruppo con un solo fsync per batch (group commit) e ogni tanto compatta il
+# file riscrivendo solo gli ultimi ordini.
+
+_STOP = object()
+
+
+class OrderJournal:
+    """Persistenza degli ordini su file JSONL con writer in background"""
+
+    def __init__(self, path: pathlib.Path, legacy_path: pathlib.Path = None, keep: int = ORDERS_KEEP,
+                 fsync_ms: int = ORDERS_FSYNC_MS, compact_every: int = ORDERS_COMPACT_EVERY):
+        self.path = pathlib.Path(path)
+        self.legacy_path = pathlib.Path(legacy_path) if legacy_path else None
+        self.keep = keep
+        self.group_window = fsync_ms / 1000.0
+        self.compact_every = compact_every
+        self._queue = queue.SimpleQueue()
+        self._recent = deque(maxlen=keep)  # ultimi ordini, riscritti dalla compattazione
+        self._since_compact = 0
+        self._thread = None
+        # metriche
+        self.written = 0
+        self.commits = 0
+        self.compactions = 0
+
+    # ------------------ Recupero all'avvio ------------------
+
+    def recover(self) -> list:
+        """Ultimi `keep` ordini dal journal (o dal vecchio orders.json)"""
+        orders = []
+        if self.path.exists():
+            recent = deque(maxlen=self.keep)  # solo righe valide, così ne restano `keep`
+            truncated = False
+            with open(self.path) as f:
+                for line in f:
+                    truncated = not line.endswith("\n")
+                    try:
+                        recent.append(json.loads(line))
+                    except ValueError:
+                        pass  # riga troncata da un arresto durante la scrittura
+            orders = list(recent)
+            self._recent.extend(orders)
+            if truncated:
+                self._compact()  # elimina la riga troncata prima di appendere
+        elif self.legacy_path is not None and self.legacy_path.exists():
+            with open(self.legacy_path) as f:
+                orders = json.load(f)[-self.keep:]
+            self._recent.extend(orders)
+            self._compact()  # migra il vecchio formato nel journal
+        return orders
+
+    # ------------------ Scrittura ------------------
+
+    def append(self, order: dict):
+        """Accoda un ordine senza bloccare (sicuro da chiamare nell'event loop)"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._writer, name="order-journal", daemon=True)
+            self._thread.start()
+        self._queue.put(order)
+
+    def _writer(self):
+        f = open(self.path, "a")
+        try:
+            stop = False
+            while not stop:
+                batch = [self._queue.get()]
+                # raccoglie gli ordini arrivati entro la finestra di group commit
+                deadline = time.monotonic() + self.group_window
+                while batch[-1] is not _STOP:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+                stop = batch[-1] is _STOP
+                records = [o for o in batch if o is not _STOP]
+                if records:
+                    f.write("".join(json.dumps(o, separators=(",", ":")) + "\n" for o in records))
+                    f.flush()
+                    os.fsync(f.fileno())  # un solo fsync per tutto il batch
+                    self.written += len(records)
+                    self.commits += 1
+                    self._recent.extend(records)
+                    self._since_compact += len(records)
+                if self._since_compact >= self.compact_every:
+                    f.close()
+                    self._compact()
+                    f = open(self.path, "a")
+        finally:
+            f.close()
+
+    def _compact(self):
+        """Riscrive il journal con i soli ultimi `keep` ordini (sostituzione atomica)"""
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp, "w") as f:
+            f.write("".join(json.dumps(o, separators=(",", ":")) + "\n" for o in self._recent))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._since_compact = 0
+        self.compactions += 1
+
+    def close(self):
+        """Scrive gli ordini in coda e ferma il writer"""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "written": self.written,
+            "commits": self.commits,
+            "compactions": self.compactions,
+            "pending": self._queue.qsize(),
+        }
@@ -0,0 +1,181 @@
+import asyncio
+import itertools
+import time
+from collections import OrderedDict
+from .settings import WS_SEND_QUEUE, WS_MAX_LAG_SECONDS, WS_SEND_TIMEOUT
+from .wire import Frame, encode, send_data
+
+# Coda di invio limitata per ogni client WebSocket: chi legge da Binance
+# accoda senza mai attendere il socket del client, un task separato invia.
+# "drop_oldest" → a coda piena si scarta il messaggio più vecchio
+# "conflate"    → si tiene solo l'ultimo messaggio per chiave (es. simbolo)
+# Un client che resta indietro (scarti continui) per più di `max_lag`
+# secondi viene disconnesso con codice 1013, così come un client il cui
+# socket resta bloccato su un invio per più di WS_SEND_TIMEOUT secondi.
+# In alternativa al pump messaggio per messaggio, pump_batches invia a
+# cadenza fissa un solo frame con quanto accodato (già conflato per chiave).
+
+POLICIES = ("drop_oldest", "conflate")
+SLOW_CLOSE_CODE = 1013  # "try again later"
+
+
+def parse_policy(name: str, default: str) -> str:
+    """Valida la politica richiesta dal client; ValueError se sconosciuta"""
+    name = (name or default).lower()
+    if name not in POLICIES:
+        raise ValueError(f"politica di coda non valida: {name} ({' | '.join(POLICIES)})")
+    return name
+
+
+class OutboundQueue:
+    """Messaggi in attesa di invio verso un client"""
+
+    def __init__(self, maxsize: int = WS_SEND_QUEUE, policy: str = "drop_oldest",
+                 max_lag: float = WS_MAX_LAG_SECONDS, drops=None):
+        if policy not in POLICIES:
+            raise ValueError(f"politica di coda non valida: {policy} ({' | '.join(POLICIES)})")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.max_lag = max_lag
+        self.drops = drops  # Counter delle metriche, opzionale
+        self._items = OrderedDict()  # chiave -> frame, in ordine di arrivo
+        self._auto_key = itertools.count()
+        self._ready = asyncio.Event()
+        self.behind_since = None  # primo scarto da quando la coda non si è più svuotata
+        self.closed = False
+        self.lagging = False
+        # metriche
+        self.dropped = 0
+        self.conflated = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, frame, key=None):
+        """Accoda senza mai attendere; con "conflate" sostituisce il messaggio con la stessa chiave"""
+        if self.closed:
+            return
+        if self.policy == "conflate" and key is not None:
+            if self._items.pop(key, None) is not None:
+                self.conflated += 1
+        else:
+            key = next(self._auto_key)
+        if len(self._items) >= self.maxsize:
+            self._items.popitem(last=False)
+            self._dropped()
+        self._items[key] = frame
+        self._ready.set()
+
+    def _dropped(self):
+        self.dropped += 1
+        if self.drops is not None:
+            self.drops.inc()
+        now = time.monotonic()
+        if self.behind_since is None:
+            self.behind_since = now
+        elif now - self.behind_since > self.max_lag:
+            self.lagging = True  # il client non recupera: verrà disconnesso
+            self.close()
+
+    def close(self):
+        """Sveglia il lettore, che riceverà None"""
+        self.closed = True
+        self._ready.set()
+
+    async def get(self):
+        """Prossimo messaggio, None se la coda è stata chiusa"""
+        while not self._items:
+            if self.closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        if self.closed:
+            return None
+        _, frame = self._items.popitem(last=False)
+        if not self._items:
+            self.behind_since = None  # il client ha recuperato
+        return frame
+
+    def drain(self) -> list:
+        """Tutti i messaggi in attesa, in ordine di arrivo (invio a lotti)"""
+        frames = list(self._items.values())
+        self._items.clear()
+        self.behind_since = None
+        return frames
+
+    def stats(self) -> dict:
+        return {
+            "policy": self.policy,
+            "pending": len(self._items),
+            "dropped": self.dropped,
+            "conflated": self.conflated,
+            "lagging": self.lagging,
+        }
+
+
+async def send_bounded(websocket, queue: OutboundQueue, data, timeout: float = WS_SEND_TIMEOUT) -> bool:
+    """send_data con tempo massimo; False (coda chiusa per ritardo) se il client non riceve"""
+    try:
+        await asyncio.wait_for(send_data(websocket, data), timeout)
+    except asyncio.TimeoutError:
+        queue.lagging = True
+        queue.close()
+        return False
+    return True
+
+
+async def close_slow(websocket, queue: OutboundQueue, counter=None, timeout: float = WS_SEND_TIMEOUT) -> bool:
+    """Chiude il client se la coda è stata chiusa per ritardo; True se chiuso"""
+    if not queue.lagging:
+        return False
+    if counter is not None:
+        counter.inc()
+    try:
+        # anche il frame di chiusura può restare bloccato sul socket
+        await asyncio.wait_for(websocket.close(code=SLOW_CLOSE_CODE, reason="client troppo lento"), timeout)
+    except Exception:
+        pass
+    return True
+
+
+async def pump_batches(websocket, queue: OutboundQueue, fmt: str, interval: float, layout: str = None,
+                       send_hist=None, sent=None, sent_bytes=None):
+    """Ogni `interval` secondi invia in un solo frame (array) i messaggi accodati nel frattempo"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time()
+    while not queue.closed:
+        deadline += interval
+        await asyncio.sleep(max(0.0, deadline - loop.time()))
+        frames = queue.drain()
+        if not frames:
+            continue  # niente di cambiato: nessun frame
+        started = time.perf_counter()
+        data = encode(Frame([f.payload for f in frames], layout, stateful=False), fmt)
+        if not await send_bounded(websocket, queue, data):
+            return
+        if send_hist is not None:
+            send_hist.observe(time.perf_counter() - started)
+        if sent is not None:
+            sent.inc()
+        if sent_bytes is not None:
+            sent_bytes.inc(len(data))
+        if loop.time() > deadline + interval:
+            deadline = loop.time()  # invio più lento della cadenza: niente raffiche di recupero
+
+
+async def pump(websocket, queue: OutboundQueue, fmt: str, stream=None, send_hist=None, sent=None, sent_bytes=None):
+    """Invia i messaggi della coda finché non viene chiusa (o il client si disconnette)"""
+    while True:
+        frame = await queue.get()
+        if frame is None:
+            return
+        started = time.perf_counter()
+        data = encode(frame, fmt, stream)
+        if not await send_bounded(websocket, queue, data):
+            return
+        if send_hist is not None:
+            send_hist.observe(time.perf_counter() - started)
+        if sent is not None:
+            sent.inc()
+        if sent_bytes is not None:
+            sent_bytes.inc(len(data))
@@ -0,0 +1,126 @@
+import math
+import secrets
+import time
+from collections import OrderedDict
+from .ai_utils import FEATURE_COLUMNS
+from .indicators import StreamingFeatures
+from .ring_buffer import CandleRing
+from .settings import SESSION_WINDOW, SESSION_MAX, SESSION_IDLE_SECONDS
+
+# Sessioni di predizione per i client REST: il client crea una sessione per
+# simbolo, invia le candele man mano e legge l'ultima predizione. Il server
+# tiene la finestra in un CandleRing e aggiorna le feature in modo
+# incrementale (StreamingFeatures), come la pipeline di /ws/signals. Le
+# sessioni inattive scadono; il numero di sessioni è limitato e la memoria
+# dei buffer è riportata nelle statistiche.
+
+SESSION_OVERHEAD_BYTES = 4096  # stima per sessione di stato indicatori e oggetti Python
+
+
+class SessionLimit(Exception):
+    """Troppe sessioni attive"""
+
+
+class PredictSession:
+    """Finestra di candele e stato degli indicatori di un client"""
+
+    def __init__(self, session_id: str, symbol: str, model_key: str, window: int = SESSION_WINDOW):
+        self.id = session_id
+        self.symbol = symbol
+        self.model_key = model_key
+        self.window = CandleRing(window)
+        self.features = StreamingFeatures()
+        self.row = None  # ultime feature calcolate
+        self.prediction = None  # ultima predizione (None se da ricalcolare)
+        self.seq = 0  # invii di candele ricevuti: una predizione vale solo per il suo seq
+        self.created = time.time()
+        self.last_used = time.monotonic()
+
+    def push(self, candles: list):
+        """Candele (t, o, h, l, c, v, x) dalla più vecchia; x falso = candela in corso"""
+        for t, o, h, l, c, v, x in candles:
+            self.window.push(t, o, h, l, c, v)
+            self.row = self.features.update(c, x, t)
+        if candles:
+            self.seq += 1
+            self.prediction = None
+
+    def feature_row(self) -> list:
+        # NaN (indicatore non ancora pronto) → 0.0, come il fillna(0) delle feature
+        return [0.0 if math.isnan(self.row[col]) else self.row[col] for col in FEATURE_COLUMNS]
+
+    @property
+    def nbytes(self) -> int:
+        return self.window.nbytes + SESSION_OVERHEAD_BYTES
+
+    def info(self) -> dict:
+        return {
+            "id": self.id,
+            "symbol": self.symbol,
+            "model": self.model_key,
+            "candles": len(self.window),
+            "ready": self.features.ready,
+            "t": int(self.window.last_t) if len(self.window) else None,
+        }
+
+
+class SessionStore:
+    """Sessioni attive in ordine di ultimo uso, con scadenza per inattività"""
+
+    def __init__(self, max_sessions: int = SESSION_MAX, idle_seconds: float = SESSION_IDLE_SECONDS,
+                 window: int = SESSION_WINDOW):
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.window = window
+        self._sessions = OrderedDict()  # id -> PredictSession, dal meno recente
+        # metriche
+        self.created = 0
+        self.expired = 0
+        self.rejected = 0
+
+    def expire(self):
+        """Rimuove le sessioni inattive da più di idle_seconds"""
+        cutoff = time.monotonic() - self.idle_seconds
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if session.last_used > cutoff:
+                break
+            del self._sessions[session.id]
+            self.expired += 1
+
+    def create(self, symbol: str, model_key: str) -> PredictSession:
+        self.expire()
+        if len(self._sessions) >= self.max_sessions:
+            self.rejected += 1
+            raise SessionLimit(f"massimo {self.max_sessions} sessioni attive")
+        session = PredictSession(secrets.token_urlsafe(12), symbol, model_key, self.window)
+        self._sessions[session.id] = session
+        self.created += 1
+        return session
+
+    def get(self, session_id: str):
+        """Sessione attiva (e ne rinnova la scadenza), None se assente o scaduta"""
+        self.expire()
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session.last_used = time.monotonic()
+            self._sessions.move_to_end(session_id)
+        return session
+
+    def delete(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    def stats(self) -> dict:
+        self.expire()
+        return {
+            "active": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "memory_bytes": sum(s.nbytes for s in self._sessions.values()),
+            "created": self.created,
+            "expired": self.expired,
+            "rejected": self.rejected,
+        }
+
+
+# sessioni condivise dal processo
+sessions = SessionStore()
@@ -0,0 +1,81 @@
+import threading
+from collections import OrderedDict
+from . import ai_utils
+from .settings import PREDICTION_CACHE_SIZE, PREDICTION_CACHE_DIGITS
+
+# Memoizzazione delle predizioni: a mercato fermo gli aggiornamenti della
+# candela in corso producono spesso la stessa riga di feature. La chiave è
+# (modello, versione dei modelli, feature arrotondate a N cifre significative),
+# con espulsione LRU. Quando reload_models() incrementa model_version la
+# cache viene svuotata al primo accesso successivo.
+
+
+class PredictionCache:
+    """Cache LRU delle probabilità per riga di feature quantizzata"""
+
+    def __init__(self, size: int = PREDICTION_CACHE_SIZE, digits: int = PREDICTION_CACHE_DIGITS):
+        self.size = size
+        self._fmt = f".{digits}g"
+        self._entries = OrderedDict()
+        self._version = ai_utils.model_version
+        self._lock = threading.Lock()  # usata sia dall'event loop sia da /predict (threadpool)
+        # metriche
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def key(self, model_key: str, row) -> tuple:
+        fmt = self._fmt
+        return (model_key, *(format(v, fmt) for v in row))
+
+    def _check_version(self):
+        if self._version != ai_utils.model_version:
+            self._entries.clear()
+            self._version = ai_utils.model_version
+            self.invalidations += 1
+
+    def get(self, key):
+        """Probabilità memorizzate per la chiave, None se assenti"""
+        with self._lock:
+            self._check_version()
+            proba = self._entries.get(key)
+            if proba is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return proba
+
+    def put(self, key, proba, version: int):
+        """Memorizza il risultato calcolato con i modelli alla versione `version`"""
+        with self._lock:
+            self._check_version()
+            if version != self._version:
+                return  # predizione partita prima di un reload: non va conservata
+            self._entries[key] = proba
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+# cache condivisa dal processo
+cache = PredictionCache()
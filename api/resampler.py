@@ -0,0 +1,145 @@
+import time
+from .intervals import interval_ms, KLINE_INTERVALS
+from .settings import RESAMPLE_EMIT_MS
+
+# Aggregazione in streaming delle kline da 1s in barre di qualsiasi multiplo
+# di 1s (5s, 15s, 1m, 5m, ...). La barra corrente è la somma delle kline da
+# 1s già chiuse più quella in corso; la barra viene emessa chiusa (x=True)
+# appena si chiude il suo ultimo secondo o arriva un secondo del periodo
+# successivo, mentre gli aggiornamenti in corso sono limitati a uno ogni
+# `emit_ms`. Una barra che non copre tutto il periodo (stream iniziato a metà
+# e seed REST mancante o incompleto) porta "p": true, anche quando è chiusa.
+
+DAY_MS = 86_400_000
+
+
+def can_resample(interval: str) -> bool:
+    """Intervalli in s/m/h che dividono il giorno (barre allineate come quelle di Binance)"""
+    if interval[-1:] not in ("s", "m", "h"):
+        return False
+    try:
+        ms = interval_ms(interval)
+    except ValueError:
+        return False
+    return ms > 1000 and DAY_MS % ms == 0
+
+
+def valid_interval(interval: str) -> bool:
+    return interval in KLINE_INTERVALS or can_resample(interval)
+
+
+def _merge(bar: dict, k: dict) -> dict:
+    """bar seguita da k (entrambe OHLCV)"""
+    if bar is None:
+        return {"o": k["o"], "h": k["h"], "l": k["l"], "c": k["c"], "v": k["v"]}
+    return {
+        "o": bar["o"],
+        "h": max(bar["h"], k["h"]),
+        "l": min(bar["l"], k["l"]),
+        "c": k["c"],
+        "v": bar["v"] + k["v"],
+    }
+
+
+class Resampler:
+    """Barre di `interval` costruite dalle kline da 1s di un simbolo"""
+
+    def __init__(self, symbol: str, interval: str, emit_ms: float = RESAMPLE_EMIT_MS):
+        self.symbol = symbol
+        self.interval = interval
+        self.ms = interval_ms(interval)
+        self.emit_interval = emit_ms / 1000.0
+        self.start = None      # apertura della barra corrente
+        self.bar = None        # kline da 1s chiuse della barra corrente
+        self.pending = None    # kline da 1s in corso
+        self.closed = False    # barra corrente già emessa chiusa
+        self.first_live = None  # primo secondo ricevuto dallo stream
+        self.seeded_until = None  # ultimo secondo già coperto dal seed REST
+        self.partial = None    # apertura della barra iniziata a metà periodo (senza seed)
+        self._last_emit = 0.0
+
+    def _candle(self, bar: dict, closed: bool) -> dict:
+        return {"t": self.start, "s": self.symbol, "i": self.interval, **bar, "x": closed,
+                "p": self.start == self.partial}
+
+    def _commit(self, k: dict):
+        self.bar = _merge(self.bar, k)
+
+    def _close(self) -> dict:
+        candle = self._candle(self.bar, True)
+        self.closed = True
+        self.bar = None
+        self.pending = None
+        return candle
+
+    def update(self, k: dict) -> list:
+        """Kline da 1s (dict t/o/h/l/c/v/x) → barre da emettere"""
+        t = k["t"]
+        if self.seeded_until is not None and t <= self.seeded_until:
+            return []  # secondo già incluso dal seed
+        start = t - t % self.ms
+        if self.first_live is None:
+            self.first_live = t
+            if self.seeded_until is None:
+                if t != start:
+                    self.partial = start
+            elif t > self.seeded_until + 1000 and start == self.start:
+                self.partial = start  # secondi persi tra il seed e il primo live
+        out = []
+        if self.start is not None and start != self.start:
+            if start < self.start:
+                return []  # aggiornamento in ritardo di una barra già chiusa
+            # primo secondo del periodo successivo: chiude la barra precedente
+            if self.pending is not None:
+                self._commit(self.pending)  # chiusura del secondo persa
+            if self.bar is not None and not self.closed:
+                out.append(self._close())
+            self.bar = self.pending = None
+            self.closed = False
+        self.start = start
+        if self.closed:
+            return out
+
+        if self.pending is not None and self.pending["t"] < t:
+            self._commit(self.pending)  # chiusura del secondo precedente persa
+            self.pending = None
+        if k["x"]:
+            self._commit(k)
+            self.pending = None
+            if t + 1000 >= start + self.ms:
+                out.append(self._close())  # ultimo secondo della barra
+                self._last_emit = time.monotonic()
+                return out
+        else:
+            self.pending = k
+
+        now = time.monotonic()
+        if out or now - self._last_emit >= self.emit_interval:
+            bar = self.bar if self.pending is None else _merge(self.bar, self.pending)
+            out.append(self._candle(bar, False))
+            self._last_emit = now
+        return out
+
+    def seed(self, klines: list, now_ms: int):
+        """Kline da 1s storiche (REST) della barra corrente, per non partire a metà periodo"""
+        start = now_ms - now_ms % self.ms
+        if self.start is not None and self.start != start:
+            return  # la barra è cambiata durante la richiesta
+        # solo secondi chiusi, della barra corrente e precedenti al primo secondo live
+        rows = [k for k in klines if start <= k["t"] and k["t"] + 1000 <= now_ms
+                and (self.first_live is None or k["t"] < self.first_live)]
+        if not rows:
+            return
+        seeded = None
+        for k in rows:
+            seeded = _merge(seeded, k)
+        # il seed precede i secondi live già accumulati
+        self.bar = seeded if self.bar is None else _merge(seeded, self.bar)
+        # completa solo se copre dall'apertura fino al primo secondo live
+        # (o fino ad adesso se lo stream non è ancora arrivato)
+        end = self.first_live if self.first_live is not None else now_ms - now_ms % 1000
+        complete = rows[0]["t"] == start and rows[-1]["t"] + 1000 >= end
+        self.partial = None if complete else start
+        if self.first_live is None:
+            self.seeded_until = rows[-1]["t"]
+        self.start = start
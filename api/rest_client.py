@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+import aiohttp
+from .intervals import interval_ms
+from .single_flight import SingleFlight
+from .weight_budget import budget, endpoint_weight, REALTIME
+from .settings import (
+    BINANCE_REST_URL, REST_POOL_SIZE, REST_TIMEOUT, REST_CACHE_TTL_MS, REST_CACHE_SIZE,
+)
+
+log = logging.getLogger(__name__)
+
+# Client HTTP asincrono condiviso per le richieste REST pubbliche a Binance
+# (klines, ticker 24h): una sola ClientSession aiohttp con pool di
+# connessioni keep-alive, nessun thread occupato durante l'attesa. Le
+# risposte restano in una piccola cache TTL per (endpoint, parametri): per
+# le klines la scadenza non supera mai la chiusura della candela in corso.
+# Le richieste identiche concorrenti condividono una sola chiamata upstream.
+# Ogni chiamata passa dal budget di peso condiviso (weight_budget): se il
+# peso non arriva entro REST_WEIGHT_MAX_WAIT si risponde con la risposta in
+# cache anche se scaduta, altrimenti con RestError 429.
+# BINANCE_REST_URL permette di puntare a un server locale nei test.
+
+KLINES = "/api/v3/klines"
+TICKER_24HR = "/api/v3/ticker/24hr"
+
+
+class RestError(Exception):
+    """Risposta HTTP di errore da Binance"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+        self.message = message
+
+
+class ResponseCache:
+    """Cache LRU con scadenza per entry"""
+
+    def __init__(self, size: int = REST_CACHE_SIZE):
+        self.size = size
+        self._entries = OrderedDict()  # chiave -> (scadenza monotonic, valore)
+        # metriche
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def get_stale(self, key):
+        """Valore anche se scaduto (ripiego quando il budget è esaurito)"""
+        entry = self._entries.get(key)
+        return None if entry is None else entry[1]
+
+    def put(self, key, value, ttl: float):
+        if ttl <= 0 or self.size <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def klines_ttl(interval: str, ttl_ms: float = REST_CACHE_TTL_MS) -> float:
+    """Secondi di validità di una risposta klines: mai oltre la chiusura della candela"""
+    try:
+        ms = interval_ms(interval)
+    except ValueError:
+        return 0.0
+    now_ms = time.time() * 1000
+    return min(ttl_ms, ms - now_ms % ms) / 1000
+
+
+class RestClient:
+    """Sessione HTTP condivisa verso l'API REST di Binance"""
+
+    def __init__(self, base_url: str = BINANCE_REST_URL, pool_size: int = REST_POOL_SIZE,
+                 timeout: float = REST_TIMEOUT, cache_ttl_ms: float = REST_CACHE_TTL_MS):
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.cache_ttl_ms = cache_ttl_ms
+        self.cache = ResponseCache()
+        self.flights = SingleFlight()
+        self._session = None
+        self._lock = asyncio.Lock()
+        # metriche
+        self.requests = 0
+        self.errors = 0
+        self.stale = 0
+
+    async def session(self) -> aiohttp.ClientSession:
+        """ClientSession condivisa (creata al primo uso, nell'event loop dell'app)"""
+        async with self._lock:
+            if self._session is None or self._session.closed:
+                self._session = aiohttp.ClientSession(
+                    connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=30),
+                    timeout=aiohttp.ClientTimeout(total=self.timeout),
+                    raise_for_status=False,
+                )
+        return self._session
+
+    async def get(self, path: str, params: dict, ttl: float = 0.0, priority: int = REALTIME):
+        """GET JSON; con ttl > 0 la risposta viene servita dalla cache finché valida"""
+        key = (path, tuple(sorted(params.items())))
+        if ttl > 0:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        return await self.flights.do(key, lambda: self._request(key, path, params, ttl, priority))
+
+    async def _request(self, key: tuple, path: str, params: dict, ttl: float, priority: int):
+        if not await budget.acquire(endpoint_weight(path, params), priority):
+            stale = self.cache.get_stale(key)
+            if stale is not None:
+                self.stale += 1
+                return stale
+            raise RestError(429, "budget di peso REST esaurito, riprovare più tardi")
+        session = await self.session()
+        self.requests += 1
+        async with session.get(self.base_url + path, params=params) as response:
+            budget.observe(response.status, response.headers)
+            data = await response.json(content_type=None)
+            if response.status >= 400:
+                self.errors += 1
+                message = data.get("msg", "") if isinstance(data, dict) else str(data)
+                raise RestError(response.status, message)
+        self.cache.put(key, data, ttl)
+        return data
+
+    async def klines(self, symbol: str, interval: str, limit: int = 500, priority: int = REALTIME, **params) -> list:
+        """Righe klines come GET /api/v3/klines (ultima candela eventualmente in corso)"""
+        params = {"symbol": symbol, "interval": interval, "limit": limit, **params}
+        return await self.get(KLINES, params, klines_ttl(interval, self.cache_ttl_ms), priority)
+
+    async def ticker_24hr(self, symbol: str) -> dict:
+        return await self.get(TICKER_24HR, {"symbol": symbol}, self.cache_ttl_ms / 1000)
+
+    async def close(self):
+        """Chiude la sessione (da chiamare allo shutdown dell'app)"""
+        async with self._lock:
+            if self._session is not None:
+                try:
+                    await self._session.close()
+                except Exception as e:
+                    log.warning("Errore chiusura sessione REST: %s", e)
+            self._session = None
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "stale": self.stale,
+            "coalesced": self.flights.coalesced,
+            **{f"cache_{k}": v for k, v in self.cache.stats().items()},
+        }
+
+
+# client condiviso dal processo
+rest = RestClient()
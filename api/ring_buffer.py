@@ -0,0 +1,96 @@
+import numpy as np
+
+# Finestra di candele a capacità fissa su un array NumPy preallocato.
+# Ogni valore viene scritto due volte (posizione i e i + capacity): così la
+# finestra ordinata dalla più vecchia alla più recente è sempre una slice
+# contigua dell'array e le viste non copiano dati.
+
+FIELDS = ("t", "o", "h", "l", "c", "v")
+_INDEX = {name: i for i, name in enumerate(FIELDS)}
+
+
+class CandleRing:
+    """Ultime `capacity` candele OHLCV (t in ms) in un buffer circolare"""
+
+    __slots__ = ("capacity", "_data", "_start", "_size")
+
+    def __init__(self, capacity: int):
+        if capacity < 1:
+            raise ValueError("capacity deve essere >= 1")
+        self.capacity = capacity
+        self._data = np.zeros((len(FIELDS), 2 * capacity), dtype=np.float64)
+        self._start = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def _write(self, pos: int, t, o, h, l, c, v):
+        col = self._data[:, pos]
+        col[0] = t; col[1] = o; col[2] = h; col[3] = l; col[4] = c; col[5] = v
+        self._data[:, pos + self.capacity] = col
+
+    def append(self, t, o, h, l, c, v):
+        """Aggiunge una candela nuova, scartando la più vecchia se piena"""
+        if self._size < self.capacity:
+            pos = (self._start + self._size) % self.capacity
+            self._size += 1
+        else:
+            pos = self._start
+            self._start = (self._start + 1) % self.capacity
+        self._write(pos, t, o, h, l, c, v)
+
+    def extend(self, data: np.ndarray):
+        """Aggiunge più candele (array campi x candele, es. view() di un altro buffer)"""
+        for row in data.T:
+            self.append(*row)
+
+    def update_last(self, t, o, h, l, c, v):
+        """Sovrascrive l'ultima candela (aggiornamento della candela in corso)"""
+        if not self._size:
+            raise IndexError("buffer vuoto")
+        self._write((self._start + self._size - 1) % self.capacity, t, o, h, l, c, v)
+
+    def push(self, t, o, h, l, c, v):
+        """Aggiorna la candela in corso se ha lo stesso open time, altrimenti la aggiunge"""
+        if self._size and self.last_t == t:
+            self.update_last(t, o, h, l, c, v)
+        elif self._size and t < self.last_t:
+            return  # messaggio in ritardo di una candela già superata
+        else:
+            self.append(t, o, h, l, c, v)
+
+    def clear(self):
+        self._start = 0
+        self._size = 0
+
+    @property
+    def nbytes(self) -> int:
+        """Memoria del buffer preallocato"""
+        return self._data.nbytes
+
+    @property
+    def last_t(self):
+        return self._data[0, self._start + self._size - 1] if self._size else None
+
+    def view(self) -> np.ndarray:
+        """Vista ordinata (campi x candele), senza copia: valida fino alla prossima scrittura"""
+        return self._data[:, self._start:self._start + self._size]
+
+    def column(self, name: str) -> np.ndarray:
+        """Vista contigua di un campo (es. "c" per le chiusure), senza copia"""
+        return self._data[_INDEX[name], self._start:self._start + self._size]
+
+    def tail(self, n: int) -> np.ndarray:
+        """Vista delle ultime n candele"""
+        end = self._start + self._size
+        return self._data[:, max(self._start, end - n):end]
+
+    def to_records(self, n: int = None) -> list:
+        """Candele come lista di dict (formato di /candles), per JSON"""
+        data = self.view() if n is None else self.tail(n)
+        t, o, h, l, c, v = data.tolist()
+        return [
+            {"t": int(t[i]), "o": o[i], "h": h[i], "l": l[i], "c": c[i], "v": v[i]}
+            for i in range(len(t))
+        ]
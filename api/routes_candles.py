@@ -1,32 +1,20 @@
 from fastapi import APIRouter, Query
-from binance import Client
-import os
+import logging
+from .candle_store import store
 
 router = APIRouter()
+log = logging.getLogger(__name__)
 
-BINANCE_API_KEY = os.getenv("BINANCE_API_KEY", "")
-BINANCE_API_SECRET = os.getenv("BINANCE_API_SECRET", "")
-client = Client(BINANCE_API_KEY, BINANCE_API_SECRET)
 
 @router.get("/candles")
-def get_candles(
+async def get_candles(
     symbol: str = Query("BTCUSDT"),
     interval: str = Query("1m"),
     limit: int = Query(100)
 ):
+    # dalla memoria se coperto, altrimenti REST (una richiesta anche con più client)
     try:
-        data = client.get_klines(symbol=symbol, interval=interval, limit=limit)
-        candles = []
-        for c in data:
-            candles.append({
-                "t": c[0],  # timestamp in ms
-                "o": float(c[1]),
-                "h": float(c[2]),
-                "l": float(c[3]),
-                "c": float(c[4]),
-                "v": float(c[5]),
-            })
-        return candles
+        return await store.get(symbol.upper(), interval, limit)
     except Exception as e:
-        print(f"❌ Errore fetching candles: {e}")
-        return []
\ No newline at end of file
+        log.error("Errore fetching candles: %s", e, extra={"symbol": symbol, "interval": interval})
+        return []
@@ -0,0 +1,45 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from .metrics import registry
+from .inference import scheduler
+from .executor import executor
+from .prediction_cache import cache
+from .candle_bootstrap import bootstrap
+from .candle_store import store
+from .ticker_hub import hub as ticker_hub
+from .rest_client import rest
+from .weight_budget import budget
+from .predict_sessions import sessions
+from .ws_signals import journal
+
+router = APIRouter()
+
+
+def _component_stats():
+    """Contatori dei componenti condivisi esposti come gauge"""
+    out = []
+    for prefix, stats in (
+        ("inference", scheduler.stats()),
+        ("executor", executor.stats()),
+        ("prediction_cache", cache.stats()),
+        ("bootstrap", bootstrap.stats()),
+        ("candle_store", store.stats()),
+        ("ticker_hub", ticker_hub.stats()),
+        ("rest", rest.stats()),
+        ("rest_budget", budget.stats()),
+        ("predict_sessions", sessions.stats()),
+        ("orders_journal", journal.stats()),
+    ):
+        for key, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                out.append((f"{prefix}_{key}", "gauge", f"{prefix} {key}", {}, value))
+    return out
+
+
+registry.register_collector(_component_stats)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # async: il rendering avviene nel thread dell'event loop, unico scrittore delle metriche
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -1,10 +1,18 @@
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, HTTPException, Query
+import asyncio
 import pandas as pd
 import numpy as np
 import time
-from .ai_utils import models, compute_features, FEATURE_COLUMNS
+from .ai_utils import models, compute_features, model_key_for, FEATURE_COLUMNS
+from .inference import scheduler
+from .executor import executor, predict_rows, ExecutorBusy
+from .prediction_cache import cache
+from .settings import PREDICT_BATCH_MAX_ROWS, PREDICT_BATCH_MAX_SERIES
+from .models.predict import BatchPredictRequest, BatchPredictResponse, SeriesPrediction
+from . import ai_utils
 
 router = APIRouter()
+LABELS = ["Strong SELL", "Weak SELL", "HOLD", "Weak BUY", "Strong BUY"]
 
 @router.get("/predict")
 def predict(
@@ -37,10 +45,17 @@ def predict(
     if model is None:
         return {"error": f"No model available for {symbol}"}
 
-    proba = model.predict_proba(X)[0]
+    row = X.values[0].tolist()
+    key = cache.key(symbol.upper(), row) if cache.enabled else None
+    proba = cache.get(key) if key else None
+    if proba is None:
+        version = ai_utils.model_version
+        proba = predict_rows(symbol.upper(), [row])[0]
+        if key:
+            cache.put(key, proba, version)
     pred = int(np.argmax(proba))
 
-    labels = ["Strong SELL", "Weak SELL", "HOLD", "Weak BUY", "Strong BUY"]
+    labels = LABELS
     signal = labels[pred]
 
     return {
@@ -52,3 +67,62 @@ def predict(
         "close": close
     }
 
+
+@router.post("/predict/batch", response_model=BatchPredictResponse)
+async def predict_batch(request: BatchPredictRequest):
+    """Probabilità per ogni candela di una o più serie OHLCV: le feature sono
+    calcolate sull'intera finestra (indicatori completi), una chiamata per tutte"""
+    if len(request.series) > PREDICT_BATCH_MAX_SERIES:
+        raise HTTPException(status_code=413, detail=f"massimo {PREDICT_BATCH_MAX_SERIES} serie per richiesta")
+    total = 0
+    for s in request.series:
+        n = len(s.c)
+        for name in ("t", "o", "h", "l", "v"):
+            column = getattr(s, name)
+            if column is not None and len(column) != n:
+                raise HTTPException(status_code=422, detail=f"{s.symbol}: '{name}' ha {len(column)} valori, 'c' {n}")
+        if s.last is not None and s.last < 1:
+            raise HTTPException(status_code=422, detail=f"{s.symbol}: last deve essere >= 1")
+        total += n
+    if total > PREDICT_BATCH_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"massimo {PREDICT_BATCH_MAX_ROWS} candele per richiesta")
+
+    keys = []
+    for s in request.series:
+        key = model_key_for(s.symbol.upper())
+        if key is None:
+            raise HTTPException(status_code=404, detail=f"No model available for {s.symbol}")
+        keys.append(key)
+
+    # tutte le serie in un solo job del pool CPU (un posto in coda per richiesta)
+    try:
+        results = await executor.predict_series([
+            (key, s.c, s.last) for key, s in zip(keys, request.series) if s.c
+        ])
+    except ExecutorBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="predizione oltre il timeout dell'executor")
+
+    out = []
+    results = iter(results)
+    for key, s in zip(keys, request.series):
+        proba, warmup = next(results) if s.c else (np.empty((0, len(LABELS))), 0)
+        pred = proba.argmax(axis=1) if len(proba) else []
+        t = s.t if s.t is None or s.last is None else s.t[-s.last:]
+        out.append(SeriesPrediction(
+            symbol=s.symbol.upper(),
+            model=key,
+            warmup=warmup,
+            t=t,
+            signal=[LABELS[i] for i in pred],
+            confidence=np.round(proba.max(axis=1), 3).tolist() if len(proba) else [],
+            probs=np.round(proba, 3).tolist(),
+        ))
+    return BatchPredictResponse(labels=LABELS, series=out)
+
+
+@router.get("/inference/stats")
+async def inference_stats():
+    """Metriche del micro-batching (dimensione dei batch, attesa in coda), dell'executor e della cache"""
+    return {**scheduler.stats(), "executor": executor.stats(), "cache": cache.stats()}
@@ -0,0 +1,104 @@
+from fastapi import APIRouter, HTTPException
+import asyncio
+import numpy as np
+from .ai_utils import model_key_for
+from .inference import scheduler
+from .executor import ExecutorBusy
+from .predict_sessions import sessions, SessionLimit
+from .routes_predict import LABELS
+from .settings import SESSION_MAX_PUSH
+from .models.predict import CreateSessionRequest, PushCandlesRequest
+
+router = APIRouter()
+
+# Flusso: POST /predict/sessions {"symbol", "candles": [...]} → id,
+# poi POST /predict/sessions/{id}/candles con le nuove candele e
+# GET /predict/sessions/{id} per rileggere l'ultima predizione.
+# Tutte le rotte sono async: SessionStore non è thread-safe e va usato solo
+# dall'event loop (niente threadpool di Starlette).
+
+
+def _candles(candles: list) -> list:
+    if len(candles) > SESSION_MAX_PUSH:
+        raise HTTPException(status_code=413, detail=f"massimo {SESSION_MAX_PUSH} candele per invio")
+    # open/high/low mancanti → close (le feature usano solo la chiusura)
+    return [
+        (k.t, k.c if k.o is None else k.o, k.c if k.h is None else k.h, k.c if k.l is None else k.l, k.c, k.v, k.x)
+        for k in candles
+    ]
+
+
+def _session(session_id: str):
+    session = sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="sessione inesistente o scaduta")
+    return session
+
+
+async def _response(session) -> dict:
+    """Stato della sessione con l'ultima predizione (ricalcolata solo dopo nuove candele)"""
+    out = session.info()
+    if not session.features.ready:
+        return out  # indicatori non ancora pronti: nessuna predizione, come su /ws/signals
+    prediction = session.prediction
+    if prediction is None:
+        seq, close = session.seq, session.row["close"]
+        try:
+            proba = await scheduler.predict(session.model_key, session.feature_row())
+        except ExecutorBusy as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="predizione oltre il timeout dell'executor")
+        pred = int(np.argmax(proba))
+        prediction = {
+            "signal": LABELS[pred],
+            "confidence": round(float(proba[pred]), 3),
+            "probs": {LABELS[i]: round(float(p), 3) for i, p in enumerate(proba)},
+            "close": close,
+        }
+        # un invio concorrente durante l'attesa ha reso la predizione vecchia:
+        # la si restituisce a questa richiesta ma non la si conserva
+        if session.seq == seq:
+            session.prediction = prediction
+    return {**out, **prediction}
+
+
+@router.post("/predict/sessions")
+async def create_session(request: CreateSessionRequest):
+    symbol = request.symbol.upper()
+    model_key = model_key_for(symbol)
+    if model_key is None:
+        raise HTTPException(status_code=404, detail=f"No model available for {symbol}")
+    candles = _candles(request.candles)
+    try:
+        session = sessions.create(symbol, model_key)
+    except SessionLimit as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    session.push(candles)
+    return await _response(session)
+
+
+@router.post("/predict/sessions/{session_id}/candles")
+async def push_candles(session_id: str, request: PushCandlesRequest):
+    candles = _candles(request.candles)
+    session = _session(session_id)
+    session.push(candles)
+    return await _response(session)
+
+
+@router.get("/predict/sessions/stats")
+async def session_stats():
+    """Sessioni attive e memoria occupata dai loro buffer"""
+    return sessions.stats()
+
+
+@router.get("/predict/sessions/{session_id}")
+async def get_session(session_id: str):
+    return await _response(_session(session_id))
+
+
+@router.delete("/predict/sessions/{session_id}")
+async def delete_session(session_id: str):
+    if not sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail="sessione inesistente o scaduta")
+    return {"status": "ok"}
@@ -1,18 +1,17 @@
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, HTTPException, Query
 from .models.ticker import TickerResponse
-from binance import Client
-import os
+from .rest_client import rest, RestError
 
 router = APIRouter()
 
-# usa API key Binance se le hai, altrimenti funziona anche senza
-BINANCE_API_KEY = os.getenv("BINANCE_API_KEY")
-BINANCE_API_SECRET = os.getenv("BINANCE_API_SECRET")
-client = Client(BINANCE_API_KEY, BINANCE_API_SECRET)
-
+# ticker 24h pubblico: nessuna API key, client HTTP asincrono condiviso (con cache breve)
 @router.get("/tickers", response_model=TickerResponse)
-def get_ticker(symbol: str = Query("BTCUSDT")):
-    data = client.get_ticker(symbol=symbol)
+async def get_ticker(symbol: str = Query("BTCUSDT")):
+    try:
+        data = await rest.ticker_24hr(symbol.upper())
+    except RestError as e:
+        status = 502 if e.status >= 500 else 503 if e.status == 429 else 400
+        raise HTTPException(status_code=status, detail=e.message)
     return TickerResponse(
     symbol=data["symbol"],
     price=float(data["lastPrice"]),
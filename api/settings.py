@@ -0,0 +1,141 @@
+import os
+
+# Parametri runtime dell'API, sovrascrivibili con variabili d'ambiente
+
+
+def _int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+def _float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+# ------------------ /ws/signals ------------------
+
+# candele tenute in memoria per simbolo (finestra live e candles.json)
+SIGNAL_WINDOW = _int("SIGNAL_WINDOW", 300)
+# candele storiche caricate via REST all'avvio di una pipeline (default: la
+# finestra intera; mai meno di quelle che servono a EMA50 per essere pronta)
+SIGNAL_BOOTSTRAP = _int("SIGNAL_BOOTSTRAP", SIGNAL_WINDOW)
+# modalità di valutazione di default (tick | close | debounce | change),
+# ogni client può sceglierne un'altra con ?mode=
+SIGNAL_EVAL_MODE = os.getenv("SIGNAL_EVAL_MODE", "tick")
+SIGNAL_DEBOUNCE_MS = _int("SIGNAL_DEBOUNCE_MS", 1000)
+SIGNAL_CHANGE_THRESHOLD = _float("SIGNAL_CHANGE_THRESHOLD", 0.001)  # 0.1%
+
+# ------------------ Invio ai client WebSocket ------------------
+
+# messaggi in coda per client prima di scartare (o conflare) i più vecchi
+WS_SEND_QUEUE = _int("WS_SEND_QUEUE", 100)
+# secondi di scarti continui dopo i quali un client lento viene disconnesso
+WS_MAX_LAG_SECONDS = _float("WS_MAX_LAG_SECONDS", 10.0)
+# secondi massimi per un singolo invio: oltre, il socket del client non accetta
+# più dati (TCP bloccato) e il client viene disconnesso come lento
+WS_SEND_TIMEOUT = _float("WS_SEND_TIMEOUT", 5.0)
+# stream (simbolo, intervallo) iscrivibili da una connessione /ws/candles1s
+CANDLES_MAX_STREAMS = _int("CANDLES_MAX_STREAMS", 50)
+# intervalli s/m/h costruiti dallo stream da 1s: di default solo quelli che
+# Binance non offre (es. 5s e 15s), "1" = anche quelli nativi (1m, 5m, 1h, ...)
+# invece di aprire altri stream
+CANDLES_RESAMPLE = os.getenv("CANDLES_RESAMPLE", "0") not in ("0", "false", "no")
+# cadenza massima degli aggiornamenti delle barre in corso (la chiusura è immediata)
+RESAMPLE_EMIT_MS = _float("RESAMPLE_EMIT_MS", 1000)
+# pagine REST da 1000 kline da 1s per il seed della prima barra (44 coprono 12h);
+# oltre, la prima barra resta parziale
+RESAMPLE_SEED_PAGES = _int("RESAMPLE_SEED_PAGES", 44)
+
+# ------------------ /ws/tickers ------------------
+
+# simboli del feed ticker condiviso: "all" (stream !miniTicker@arr di tutto
+# il mercato), un file JSON di monete (es. configs/approved_coins_top20mcap.json)
+# oppure un elenco separato da virgole
+TICKERS_UNIVERSE = os.getenv(
+    "TICKERS_UNIVERSE",
+    "btcusdt,ethusdt,bnbusdt,solusdt,xrpusdt,adausdt,dogeusdt,dotusdt,avaxusdt,linkusdt",
+)
+# valuta di quotazione aggiunta alle monete senza (es. "BTC" → "BTCUSDT")
+TICKERS_QUOTE = os.getenv("TICKERS_QUOTE", "USDT")
+# modalità snapshot (?mode=snapshot): frame con i ticker cambiati al secondo
+# (ogni client può chiedere un'altra cadenza con ?hz=, fino al massimo)
+TICKERS_SNAPSHOT_HZ = _float("TICKERS_SNAPSHOT_HZ", 4)
+TICKERS_SNAPSHOT_MAX_HZ = _float("TICKERS_SNAPSHOT_MAX_HZ", 20)
+# simboli in attesa per client con il feed di tutto il mercato (uno per simbolo;
+# in modalità snapshot sempre)
+TICKERS_SNAPSHOT_QUEUE = _int("TICKERS_SNAPSHOT_QUEUE", 4096)
+
+# ------------------ REST Binance ------------------
+
+# indirizzo dell'API REST (un server locale per i test)
+BINANCE_REST_URL = os.getenv("BINANCE_REST_URL", "https://api.binance.com")
+# connessioni keep-alive del client HTTP condiviso e timeout per richiesta
+REST_POOL_SIZE = _int("REST_POOL_SIZE", 20)
+REST_TIMEOUT = _float("REST_TIMEOUT", 10.0)
+# validità delle risposte in cache (per le klines mai oltre la chiusura della candela)
+REST_CACHE_TTL_MS = _float("REST_CACHE_TTL_MS", 1000)
+REST_CACHE_SIZE = _int("REST_CACHE_SIZE", 1024)
+# peso REST al minuto concesso da Binance per IP e quota che ci concediamo
+REST_WEIGHT_LIMIT = _int("REST_WEIGHT_LIMIT", 6000)
+REST_WEIGHT_USAGE = _float("REST_WEIGHT_USAGE", 0.8)
+# frazione del budget riservata alle richieste realtime (lo storico non la usa)
+REST_WEIGHT_RESERVE = _float("REST_WEIGHT_RESERVE", 0.25)
+# attesa massima del budget prima di rispondere dalla cache scaduta o con errore
+REST_WEIGHT_MAX_WAIT = _float("REST_WEIGHT_MAX_WAIT", 5.0)
+
+# ------------------ /candles ------------------
+
+# candele chiuse tenute in memoria per (simbolo, intervallo), max 1000 come il REST
+CANDLE_STORE_CAPACITY = _int("CANDLE_STORE_CAPACITY", 1000)
+# età massima della candela in corso servita dalla memoria (oltre: REST)
+CANDLE_STORE_OPEN_MAX_AGE_MS = _float("CANDLE_STORE_OPEN_MAX_AGE_MS", 5000)
+# serie (simbolo, intervallo) in memoria: oltre si scarta la meno usata di recente,
+# preferendo quelle che nessuno stream live sta aggiornando
+CANDLE_STORE_MAX_SERIES = _int("CANDLE_STORE_MAX_SERIES", 512)
+
+# ------------------ Inferenza ------------------
+
+# finestra di raccolta delle righe da valutare insieme (tutti i simboli)
+INFERENCE_BATCH_WINDOW_MS = _float("INFERENCE_BATCH_WINDOW_MS", 5)
+# dimensione massima di un batch prima della valutazione immediata
+INFERENCE_MAX_BATCH = _int("INFERENCE_MAX_BATCH", 256)
+# valutatore ad alberi compilato (verificato contro predict_proba al primo uso)
+INFERENCE_COMPILED = os.getenv("INFERENCE_COMPILED", "1") not in ("0", "false", "no")
+# oltre queste righe per batch predict_proba nativa torna competitiva
+INFERENCE_COMPILED_MAX_ROWS = _int("INFERENCE_COMPILED_MAX_ROWS", 64)
+# cache LRU delle predizioni (0 = disattivata, default; es. 4096 per attivarla)
+# e cifre significative della chiave
+PREDICTION_CACHE_SIZE = _int("PREDICTION_CACHE_SIZE", 0)
+PREDICTION_CACHE_DIGITS = _int("PREDICTION_CACHE_DIGITS", 6)
+# candele massime (somma delle serie) e serie massime per richiesta POST /predict/batch
+PREDICT_BATCH_MAX_ROWS = _int("PREDICT_BATCH_MAX_ROWS", 50000)
+PREDICT_BATCH_MAX_SERIES = _int("PREDICT_BATCH_MAX_SERIES", 500)
+# sessioni di predizione REST: candele tenute per sessione, sessioni massime,
+# scadenza per inattività e candele massime per singolo invio
+SESSION_WINDOW = _int("SESSION_WINDOW", 300)
+SESSION_MAX = _int("SESSION_MAX", 1000)
+SESSION_IDLE_SECONDS = _float("SESSION_IDLE_SECONDS", 900)
+SESSION_MAX_PUSH = _int("SESSION_MAX_PUSH", 1000)
+
+# executor per il lavoro CPU-bound: "thread" oppure "process"
+EXECUTOR_KIND = os.getenv("EXECUTOR_KIND", "thread")
+EXECUTOR_WORKERS = _int("EXECUTOR_WORKERS", 2)
+# job in attesa oltre i quali le nuove richieste vengono rifiutate
+EXECUTOR_MAX_QUEUE = _int("EXECUTOR_MAX_QUEUE", 64)
+# secondi massimi per job prima di restituire errore al chiamante
+EXECUTOR_TIMEOUT = _float("EXECUTOR_TIMEOUT", 2.0)
+
+# ------------------ Ordini simulati ------------------
+
+# ordini conservati nel journal dopo la compattazione (e caricati all'avvio)
+ORDERS_KEEP = _int("ORDERS_KEEP", 500)
+# finestra di group commit: ordini scritti insieme con un solo fsync
+ORDERS_FSYNC_MS = _int("ORDERS_FSYNC_MS", 200)
+# righe appese dopo le quali il journal viene compattato
+ORDERS_COMPACT_EVERY = _int("ORDERS_COMPACT_EVERY", 1000)
+
+# ------------------ Logging ------------------
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # text | json
+# intervallo minimo tra due eventi di debug per-tick con la stessa chiave
+LOG_SAMPLE_SECONDS = _float("LOG_SAMPLE_SECONDS", 1.0)
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from .eval_policy import EvalPolicy
+from .outbound import OutboundQueue
+from .metrics import drops_counter
+from .settings import WS_SEND_QUEUE
+
+log = logging.getLogger(__name__)
+
+# Hub condiviso per /ws/signals: una sola connessione upstream e una sola
+# pipeline (features + predizione) per simbolo, con fan-out del payload a
+# tutti i client iscritti.
+
+class Subscription:
+    """Un client iscritto: coda di invio e politica di valutazione"""
+
+    __slots__ = ("queue", "policy")
+
+    def __init__(self, queue: OutboundQueue, policy: EvalPolicy):
+        self.queue = queue
+        self.policy = policy
+
+    def put(self, frame):
+        if frame is None:
+            self.queue.close()  # feed terminato
+        else:
+            # con "conflate" resta solo l'ultimo segnale (e l'ultimo heartbeat)
+            self.queue.put(frame, "state" if frame.stateful else "control")
+
+
+class SymbolFeed:
+    """Stato condiviso di un simbolo: modello, iscritti e task della pipeline"""
+
+    def __init__(self, symbol: str, model_key: str):
+        self.symbol = symbol
+        self.model_key = model_key
+        self.subscribers = set()
+        self.task = None
+        self.last_frame = None  # ultimo segnale completo, inviato subito ai nuovi iscritti
+
+    def due(self, price: float, closed: bool, now: float) -> list:
+        """Iscritti la cui politica richiede una nuova valutazione"""
+        return [sub for sub in self.subscribers if sub.policy.due(price, closed, now)]
+
+    def publish(self, payload, subscribers=None):
+        """Inoltra lo stesso payload agli iscritti (default: tutti) senza mai attendere"""
+        for sub in list(self.subscribers if subscribers is None else subscribers):
+            sub.put(payload)
+
+    def close(self):
+        """Segnala a tutti gli iscritti che il feed è terminato"""
+        self.publish(None)
+
+
+class SignalHub:
+    """Avvia la pipeline di un simbolo al primo iscritto e la ferma dopo l'ultimo"""
+
+    def __init__(self, pipeline, endpoint: str, queue_size: int = WS_SEND_QUEUE):
+        self.pipeline = pipeline  # coroutine pipeline(feed) che chiama feed.publish()
+        self.endpoint = endpoint  # etichetta delle metriche
+        self.queue_size = queue_size
+        self.feeds = {}
+        self._lock = asyncio.Lock()
+
+    async def subscribe(self, symbol: str, model_key: str, policy: EvalPolicy = None,
+                        queue_policy: str = "drop_oldest") -> Subscription:
+        async with self._lock:
+            feed = self.feeds.get(symbol)
+            if feed is None:
+                feed = SymbolFeed(symbol, model_key)
+                self.feeds[symbol] = feed
+                feed.task = asyncio.create_task(self._run(feed))
+                log.info("Pipeline avviata", extra={"symbol": symbol})
+            queue = OutboundQueue(self.queue_size, queue_policy, drops=drops_counter(self.endpoint, symbol))
+            sub = Subscription(queue, policy or EvalPolicy())
+            if feed.last_frame is not None:
+                sub.put(feed.last_frame)  # il client parte subito dall'ultimo segnale
+            feed.subscribers.add(sub)
+            log.info("Nuovo iscritto", extra={"symbol": symbol, "subscribers": len(feed.subscribers)})
+        return sub
+
+    async def unsubscribe(self, symbol: str, sub: Subscription):
+        task = None
+        async with self._lock:
+            feed = self.feeds.get(symbol)
+            if feed is None:
+                return
+            feed.subscribers.discard(sub)
+            if not feed.subscribers:
+                del self.feeds[symbol]
+                task = feed.task
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            log.info("Pipeline fermata (nessun iscritto)", extra={"symbol": symbol})
+
+    async def _run(self, feed: SymbolFeed):
+        try:
+            await self.pipeline(feed)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.exception("Errore pipeline", extra={"symbol": feed.symbol})
+        finally:
+            # se la pipeline termina da sola i client vengono chiusi:
+            # alla riconnessione ripartirà una pipeline nuova
+            if self.feeds.get(feed.symbol) is feed:
+                del self.feeds[feed.symbol]
+            feed.close()
+
+    def stats(self):
+        return {symbol: len(feed.subscribers) for symbol, feed in self.feeds.items()}
@@ -0,0 +1,32 @@
+import asyncio
+
+# Coalescenza delle richieste identiche (single-flight): finché una chiamata
+# per una chiave è in corso, i chiamanti successivi con la stessa chiave ne
+# attendono il risultato (o l'eccezione) invece di ripeterla. Terminata la
+# chiamata la chiave si libera: non è una cache.
+
+
+class SingleFlight:
+    """Una sola chiamata in corso per chiave, condivisa da tutti i chiamanti"""
+
+    def __init__(self):
+        self._inflight = {}  # chiave -> task in corso
+        # metriche
+        self.calls = 0      # chiamate eseguite davvero
+        self.coalesced = 0  # chiamate risparmiate (in attesa di una già in corso)
+
+    async def do(self, key, factory):
+        """Risultato di `factory()` (coroutine), eseguita una volta per le chiamate concorrenti"""
+        task = self._inflight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # shield: se un chiamante viene cancellato la chiamata continua per gli altri
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {"inflight": len(self._inflight), "calls": self.calls, "coalesced": self.coalesced}
@@ -0,0 +1,148 @@
+import asyncio
+import json
+import logging
+import pathlib
+from .binance_clients import get_socket_manager
+from .kline_hub import RETRY_SECONDS
+from .settings import TICKERS_UNIVERSE, TICKERS_QUOTE
+from .wire import Frame
+from .metrics import messages_counter, upstream_connected, allow_symbols
+
+log = logging.getLogger(__name__)
+
+# Feed ticker condiviso da tutti i client di /ws/tickers: una sola
+# connessione Binance per processo (stream !miniTicker@arr oppure multiplex
+# dei simboli configurati), una tabella con l'ultimo ticker per simbolo e
+# fan-out nelle OutboundQueue dei client. Ogni client può limitarsi a un
+# elenco di simboli senza aprire altri stream.
+
+ENDPOINT = "tickers"  # etichetta delle metriche
+
+
+def load_universe(spec: str = TICKERS_UNIVERSE, quote: str = TICKERS_QUOTE):
+    """Simboli del feed (es. ["BTCUSDT", ...]); None = tutto il mercato"""
+    spec = (spec or "all").strip()
+    if spec.lower() == "all":
+        return None
+    if spec.endswith(".json"):
+        coins = json.loads(pathlib.Path(spec).read_text())
+    else:
+        coins = [s for s in spec.split(",") if s.strip()]
+    symbols = []
+    for coin in coins:
+        symbol = coin.strip().upper()
+        if not symbol.endswith(quote):
+            symbol += quote
+        if symbol not in symbols:
+            symbols.append(symbol)
+    return symbols
+
+
+def parse_symbols(value: str):
+    """Filtro ?symbols=btcusdt,ethusdt del client; None = tutti"""
+    if not value:
+        return None
+    return frozenset(s.strip().upper() for s in value.split(",") if s.strip())
+
+
+def ticker_from_mini(data: dict) -> dict:
+    # formato compatibile con il frontend
+    return {
+        "s": data.get("s", ""),  # symbol
+        "c": float(data.get("c", 0)),  # current price
+        "o": float(data.get("o", data.get("c", 0))),  # open price
+        "h": float(data.get("h", 0)),  # high price
+        "l": float(data.get("l", 0)),  # low price
+        "v": float(data.get("v", 0))   # volume
+    }
+
+
+class TickerHub:
+    """Avvia lo stream ticker al primo client e lo ferma dopo l'ultimo"""
+
+    def __init__(self, universe=None):
+        self.universe = universe  # None = !miniTicker@arr
+        allow_symbols(universe or ())
+        self.subscribers = {}  # OutboundQueue -> simboli filtrati (None = tutti)
+        self.latest = {}  # simbolo -> ultimo Frame ticker
+        self.task = None
+        self._lock = asyncio.Lock()
+
+    async def subscribe(self, queue, symbols=None):
+        async with self._lock:
+            if self.task is None:
+                self.task = asyncio.create_task(self._run())
+                log.info("Stream ticker avviato", extra={"symbols": len(self.universe or ()) or "all"})
+            # il client parte subito dagli ultimi valori noti
+            for symbol, frame in list(self.latest.items()):
+                if symbols is None or symbol in symbols:
+                    queue.put(frame, symbol)
+            self.subscribers[queue] = symbols
+
+    async def unsubscribe(self, queue):
+        task = None
+        async with self._lock:
+            self.subscribers.pop(queue, None)
+            if not self.subscribers and self.task is not None:
+                task, self.task = self.task, None
+                self.latest.clear()
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            log.info("Stream ticker fermato (nessun client)")
+
+    def publish(self, frame: Frame):
+        symbol = frame.payload["s"]
+        if self.universe is None and symbol not in self.latest:
+            allow_symbols((symbol,))  # tutto il mercato: i simboli veri arrivano da Binance
+        self.latest[symbol] = frame
+        # conflate: per ogni simbolo resta solo l'ultimo ticker
+        for queue, symbols in list(self.subscribers.items()):
+            if symbols is None or symbol in symbols:
+                queue.put(frame, symbol)
+
+    def _socket(self, bsm):
+        if self.universe is None:
+            return bsm.miniticker_socket()
+        return bsm.multiplex_socket([f"{s.lower()}@miniTicker" for s in self.universe])
+
+    async def _run(self):
+        m_messages = messages_counter(ENDPOINT, "ALL")
+        attempt = 0
+        while True:
+            try:
+                bsm = await get_socket_manager()
+                async with self._socket(bsm) as stream:
+                    upstream_connected(ENDPOINT, "ALL")
+                    attempt = 0
+                    while True:
+                        msg = await stream.recv()
+                        m_messages.inc()
+                        # multiplex: {"stream", "data": {...}}; tutto il mercato: [{...}, ...]
+                        data = msg.get("data") if isinstance(msg, dict) else msg
+                        for item in data if isinstance(data, list) else [data]:
+                            if item and item.get("s"):
+                                self.publish(Frame(ticker_from_mini(item), "ticker"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # un errore upstream non chiude i client: lo stream viene riaperto
+                delay = RETRY_SECONDS[min(attempt, len(RETRY_SECONDS) - 1)]
+                attempt += 1
+                log.warning("Errore stream ticker, riprovo tra %ds: %s", delay, e)
+                await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        return {"clients": len(self.subscribers), "symbols": len(self.latest)}
+
+
+def _create_hub() -> TickerHub:
+    try:
+        return TickerHub(load_universe())
+    except (OSError, ValueError) as e:
+        log.error("TICKERS_UNIVERSE non valido (%s), uso tutto il mercato: %s", TICKERS_UNIVERSE, e)
+        return TickerHub()
+
+
+# hub condiviso dal processo
+hub = _create_hub()
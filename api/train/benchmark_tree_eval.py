@@ -0,0 +1,42 @@
+import sys, pathlib, time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[2]))
+from api.ai_utils import load_model, FEATURE_COLUMNS
+from api.tree_eval import compile_model, verify
+
+# ========================
+# ⚙️ Config
+# ========================
+batch_sizes = [1, 8, 64, 256]
+repeat = 200
+export_path = "model_pro_balanced.npz"
+
+
+def bench(fn, n: int) -> float:
+    fn()  # riscaldamento
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n * 1e6  # µs per chiamata
+
+
+if __name__ == "__main__":
+    model = load_model()
+    compiled = compile_model(model)
+    err = verify(compiled, model, len(FEATURE_COLUMNS), rows=2000)
+    print(f"✅ {type(model).__name__}: {len(compiled.roots)} alberi, profondità {compiled.depth}, errore max {err:.1e}")
+
+    rng = np.random.default_rng(0)
+    print(f"{'righe':>6} {'nativo µs':>12} {'compilato µs':>14} {'speedup':>8}")
+    for n in batch_sizes:
+        X = rng.normal(size=(n, len(FEATURE_COLUMNS))) * 100
+        df = pd.DataFrame(X, columns=FEATURE_COLUMNS)
+        rows = X.tolist()  # formato usato da executor.predict_rows
+        native = bench(lambda: model.predict_proba(df), repeat)
+        fast = bench(lambda: compiled.predict_proba(rows), repeat)
+        print(f"{n:>6} {native:>12.1f} {fast:>14.1f} {native / fast:>7.1f}x")
+
+    compiled.save(export_path)
+    print(f"💾 Nodi esportati in {export_path}")
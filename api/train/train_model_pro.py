@@ -1,5 +1,6 @@
 import pandas as pd
 import pandas_ta as ta
+import sys, pathlib
 from binance.client import Client
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report
@@ -7,12 +8,17 @@ import xgboost as xgb
 import joblib
 import numpy as np
 
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[2]))
+from api.weight_budget import BudgetedClient
+
 # ========================
 # 🔑 Binance API Keys (vuoti → solo dati pubblici)
 # ========================
 API_KEY = ""
 API_SECRET = ""
-client = Client(API_KEY, API_SECRET)
+# richieste limitate dal budget di peso, riallineato dal peso usato che Binance
+# riporta per IP (include API e altri script)
+client = BudgetedClient(API_KEY, API_SECRET)
 
 # ========================
 # ⚙️ Config
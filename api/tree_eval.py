@@ -0,0 +1,245 @@
+import json
+import logging
+import numpy as np
+
+# Valutatore compilato per i modelli ad alberi (XGBClassifier, RandomForest /
+# ExtraTrees di sklearn). Gli alberi vengono appiattiti in array NumPy
+# contigui (feature, soglia, figli, direzione per i NaN, valori delle foglie)
+# e la visita avviene per tutti gli alberi e tutte le righe insieme, un
+# livello alla volta. Le foglie puntano a sé stesse, quindi bastano
+# `depth` passi senza controlli. Per una riga da 7 feature evita DMatrix,
+# validazione dell'input e controlli sulle colonne pandas di predict_proba.
+
+log = logging.getLogger(__name__)
+
+
+class CompiledForest:
+    """Insieme di alberi appiattito con predict_proba vettorizzata"""
+
+    def __init__(self, feature, threshold, left, right, default_left, roots, depth,
+                 leaf_value, strict: bool, kind: str, tree_class=None, base_margin=None):
+        self.feature = feature            # (nodi,) indice della feature, 0 nelle foglie
+        self.threshold = threshold        # (nodi,) soglia di split
+        self.left = left                  # (nodi,) figlio sinistro (sé stesso nelle foglie)
+        self.right = right                # (nodi,) figlio destro (sé stesso nelle foglie)
+        self.default_left = default_left  # (nodi,) direzione per valori NaN
+        self.roots = roots                # (alberi,) indice della radice di ogni albero
+        self.depth = depth                # profondità massima
+        self.leaf_value = leaf_value      # xgboost: (nodi,) margine; sklearn: (nodi, classi) probabilità
+        self.strict = strict              # xgboost: x < soglia; sklearn: x <= soglia
+        self.kind = kind                  # "softmax" | "sigmoid" | "mean"
+        self.tree_class = tree_class      # xgboost multi-classe: classe di ogni albero
+        self.base_margin = base_margin    # xgboost: margine iniziale per classe
+        self._children = np.stack([left, right], axis=1).ravel()  # 2*nodo (+1 se a destra)
+        if tree_class is not None:
+            # (classi, alberi): somma dei margini per classe con un solo prodotto
+            self._class_matrix = (tree_class[None, :] == np.arange(len(base_margin))[:, None]).astype(np.float64)
+
+    def _leaves(self, X: np.ndarray) -> np.ndarray:
+        n = X.shape[0]
+        cols = X.T.ravel()  # feature-major: il valore (f, r) è in f * n + r
+        rows = np.arange(n)
+        node = np.repeat(self.roots, n)  # (alberi * righe,) appiattito
+        rows = np.tile(rows, len(self.roots))
+        for _ in range(self.depth):
+            x = cols.take(self.feature.take(node) * n + rows)
+            thr = self.threshold.take(node)
+            go_left = x < thr if self.strict else x <= thr
+            missing = np.isnan(x)
+            if missing.any():
+                go_left = np.where(missing, self.default_left.take(node), go_left)
+            node = self._children.take(2 * node + ~go_left)
+        return node.reshape(len(self.roots), n)
+
+    def predict_proba(self, X) -> np.ndarray:
+        """Probabilità delle classi (righe x classi), come predict_proba del modello"""
+        # entrambi i modelli confrontano l'input convertito a float32
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        leaves = self._leaves(X)
+        if self.kind == "mean":
+            return self.leaf_value[leaves].mean(axis=0)
+        values = self.leaf_value[leaves]  # (alberi, righe)
+        if self.kind == "sigmoid":
+            margin = self.base_margin[0] + values.sum(axis=0)
+            p = 1.0 / (1.0 + np.exp(-margin))
+            return np.stack([1.0 - p, p], axis=1)
+        margin = (self._class_matrix @ values).T + self.base_margin
+        margin -= margin.max(axis=1, keepdims=True)
+        e = np.exp(margin)
+        return e / e.sum(axis=1, keepdims=True)
+
+
+    _ARRAYS = ("feature", "threshold", "left", "right", "default_left", "roots", "leaf_value")
+
+    def save(self, path):
+        """Esporta gli array dei nodi in un file .npz"""
+        arrays = {name: getattr(self, name) for name in self._ARRAYS}
+        if self.tree_class is not None:
+            arrays["tree_class"] = self.tree_class
+        if self.base_margin is not None:
+            arrays["base_margin"] = self.base_margin
+        np.savez(path, depth=self.depth, strict=self.strict, kind=self.kind, **arrays)
+
+    @classmethod
+    def load(cls, path) -> "CompiledForest":
+        with np.load(path) as data:
+            return cls(
+                *(data[name] for name in cls._ARRAYS[:6]), int(data["depth"]), data["leaf_value"],
+                strict=bool(data["strict"]), kind=str(data["kind"]),
+                tree_class=data["tree_class"] if "tree_class" in data else None,
+                base_margin=data["base_margin"] if "base_margin" in data else None,
+            )
+
+
+# ------------------ Esportazione ------------------
+
+def _pack(trees):
+    """trees: lista di (feature, soglia, sinistro, destro, default_left, valori) con indici locali"""
+    offsets = np.cumsum([0] + [len(t[0]) for t in trees[:-1]])
+    feature, threshold, left, right, default_left, values, depths = [], [], [], [], [], [], []
+    for off, (feat, thr, lft, rgt, dflt, val) in zip(offsets, trees):
+        idx = np.arange(len(feat))
+        leaf = lft < 0
+        feature.append(np.where(leaf, 0, feat))
+        threshold.append(thr)
+        left.append(np.where(leaf, idx, lft) + off)
+        right.append(np.where(leaf, idx, rgt) + off)
+        default_left.append(dflt)
+        values.append(val)
+        depths.append(_depth(lft, rgt))
+    return (
+        np.concatenate(feature).astype(np.intp),
+        np.concatenate(threshold).astype(np.float64),
+        np.concatenate(left).astype(np.intp),
+        np.concatenate(right).astype(np.intp),
+        np.concatenate(default_left).astype(bool),
+        np.concatenate(values),
+        offsets.astype(np.intp),
+        max(depths),
+    )
+
+
+def _depth(left, right) -> int:
+    depth, level = 0, [0]
+    while True:
+        level = [c for n in level for c in (left[n], right[n]) if left[n] >= 0]
+        if not level:
+            return depth
+        depth += 1
+
+
+def _compile_xgboost(model) -> CompiledForest:
+    booster = model.get_booster()
+    raw = json.loads(booster.save_raw("json"))
+    learner = raw["learner"]
+    objective = learner["objective"]["name"]
+    gbm = learner["gradient_booster"]
+    if gbm["name"] != "gbtree":
+        raise ValueError(f"booster non supportato: {gbm['name']}")
+    trees_json = gbm["model"]["trees"]
+    tree_info = np.asarray(gbm["model"]["tree_info"], dtype=np.intp)
+
+    n_class = int(learner["learner_model_param"].get("num_class", "0")) or 1
+    try:  # con early stopping predict_proba usa solo i round fino al migliore
+        n_trees = (model.best_iteration + 1) * n_class * int(gbm["model"]["gbtree_model_param"].get("num_parallel_tree", "1"))
+        trees_json, tree_info = trees_json[:n_trees], tree_info[:n_trees]
+    except AttributeError:
+        pass
+
+    base = learner["learner_model_param"]["base_score"].strip("[]")
+    base_score = np.asarray([float(v) for v in base.split(",")], dtype=np.float64)
+
+    trees = []
+    for t in trees_json:
+        lft = np.asarray(t["left_children"], dtype=np.intp)
+        if any(t.get("split_type", [])) or t.get("categories"):
+            raise ValueError("split categoriali non supportati")
+        trees.append((
+            np.asarray(t["split_indices"], dtype=np.intp),
+            np.asarray(t["split_conditions"], dtype=np.float32).astype(np.float64),
+            lft,
+            np.asarray(t["right_children"], dtype=np.intp),
+            np.asarray(t["default_left"], dtype=bool),
+            np.asarray(t["split_conditions"], dtype=np.float64),  # nelle foglie è il peso
+        ))
+    feature, threshold, left, right, default_left, values, roots, depth = _pack(trees)
+
+    if objective == "multi:softprob" or objective == "multi:softmax":
+        base_margin = np.broadcast_to(base_score, (n_class,)).astype(np.float64)
+        return CompiledForest(feature, threshold, left, right, default_left, roots, depth,
+                              values, strict=True, kind="softmax", tree_class=tree_info,
+                              base_margin=base_margin)
+    if objective == "binary:logistic":
+        p = float(base_score[0])
+        # base_score è salvato come probabilità: margine = logit
+        base_margin = np.asarray([np.log(p / (1.0 - p))])
+        return CompiledForest(feature, threshold, left, right, default_left, roots, depth,
+                              values, strict=True, kind="sigmoid", base_margin=base_margin)
+    raise ValueError(f"obiettivo xgboost non supportato: {objective}")
+
+
+def _compile_sklearn(model) -> CompiledForest:
+    trees = []
+    for est in model.estimators_:
+        t = est.tree_
+        value = t.value[:, 0, :].astype(np.float64)
+        value /= np.maximum(value.sum(axis=1, keepdims=True), 1e-300)  # conteggi → probabilità
+        missing_left = getattr(t, "missing_go_to_left", None)
+        trees.append((
+            t.feature.astype(np.intp),
+            t.threshold.astype(np.float64),
+            t.children_left.astype(np.intp),
+            t.children_right.astype(np.intp),
+            np.zeros(t.node_count, dtype=bool) if missing_left is None else missing_left.astype(bool),
+            value,
+        ))
+    feature, threshold, left, right, default_left, values, roots, depth = _pack(trees)
+    return CompiledForest(feature, threshold, left, right, default_left, roots, depth,
+                          values, strict=False, kind="mean")
+
+
+def compile_model(model) -> CompiledForest:
+    """Appiattisce un XGBClassifier o una foresta sklearn; ValueError se non supportato"""
+    if hasattr(model, "get_booster"):
+        return _compile_xgboost(model)
+    if hasattr(model, "estimators_") and all(hasattr(e, "tree_") for e in model.estimators_):
+        if getattr(model, "n_outputs_", 1) != 1:
+            raise ValueError("modelli multi-output non supportati")
+        return _compile_sklearn(model)
+    raise ValueError(f"modello non supportato: {type(model).__name__}")
+
+
+def verify(compiled: CompiledForest, model, n_features: int, rows: int = 256, atol: float = 1e-5) -> float:
+    """Confronta con predict_proba nativa su righe casuali; errore massimo"""
+    import pandas as pd
+    from .ai_utils import FEATURE_COLUMNS
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(rows, n_features)) * rng.choice([1, 10, 100, 1e4], size=(1, n_features))
+    X = pd.DataFrame(X, columns=FEATURE_COLUMNS[:n_features])
+    err = float(np.abs(compiled.predict_proba(X.values) - model.predict_proba(X)).max())
+    if err > atol:
+        raise ValueError(f"differenza dal modello nativo {err:.2e} > {atol:.0e}")
+    return err
+
+
+# ------------------ Cache per l'inferenza ------------------
+
+_compiled = {}  # chiave modello -> (modello sorgente, CompiledForest o None)
+
+
+def compiled_for(model_key: str, model, n_features: int):
+    """Versione compilata e verificata del modello, None se non disponibile"""
+    entry = _compiled.get(model_key)
+    if entry is not None and entry[0] is model:
+        return entry[1]
+    try:
+        compiled = compile_model(model)
+        err = verify(compiled, model, n_features)
+        log.info("Modello %s compilato (errore max %.1e)", model_key, err)
+    except Exception as e:
+        log.warning("Modello %s non compilabile, uso predict_proba nativa: %s", model_key, e)
+        compiled = None
+    _compiled[model_key] = (model, compiled)
+    return compiled
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import time
+from urllib.parse import urlparse
+from binance import Client
+from binance.exceptions import BinanceAPIException
+from .settings import REST_WEIGHT_LIMIT, REST_WEIGHT_USAGE, REST_WEIGHT_RESERVE, REST_WEIGHT_MAX_WAIT
+
+log = logging.getLogger(__name__)
+
+# Budget condiviso del peso delle richieste REST verso Binance (limite per
+# IP al minuto). Token bucket: la capacità è la quota utilizzabile del
+# limite e si ricarica in modo continuo in un minuto. Il peso usato
+# dichiarato da Binance (X-MBX-USED-WEIGHT-1M) riallinea il bucket, così
+# conta anche il traffico degli altri processi sullo stesso IP (es. gli
+# script di training). Le richieste BULK (storico) non possono scendere
+# sotto la riserva tenuta per quelle REALTIME (bootstrap, /candles,
+# /tickers). Dopo un 429/418 nessuna richiesta parte fino al Retry-After.
+
+REALTIME = 0
+BULK = 1
+
+WEIGHT_HEADER = "X-MBX-USED-WEIGHT-1M"
+
+# peso delle richieste per endpoint (https://binance-docs.github.io/apidocs/spot)
+_WEIGHTS = {
+    "/api/v3/klines": 2,
+    "/api/v3/uiKlines": 2,
+    "/api/v3/ticker/price": 2,
+    "/api/v3/exchangeInfo": 20,
+}
+
+
+def endpoint_weight(path: str, params: dict = None) -> int:
+    """Peso di una GET pubblica (default 1 per gli endpoint non in tabella)"""
+    if path == "/api/v3/ticker/24hr":
+        return 2 if (params or {}).get("symbol") else 80
+    return _WEIGHTS.get(path, 1)
+
+
+class WeightBudget:
+    """Token bucket del peso REST con priorità e riallineamento dagli header"""
+
+    def __init__(self, limit: int = REST_WEIGHT_LIMIT, usage: float = REST_WEIGHT_USAGE,
+                 reserve: float = REST_WEIGHT_RESERVE):
+        self.limit = limit  # limite di Binance al minuto
+        self.capacity = limit * usage  # quota che ci concediamo
+        self.reserve = self.capacity * reserve  # non utilizzabile dalle richieste BULK
+        self.rate = self.capacity / 60.0  # ricarica al secondo
+        self.tokens = self.capacity
+        self.blocked_until = 0.0
+        self._updated = time.monotonic()
+        # metriche
+        self.granted = 0
+        self.waited = 0
+        self.rejected = 0
+        self.used_weight = 0  # ultimo valore dell'header
+        self.rate_limited = 0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve_wait(self, weight: int, priority: int = REALTIME) -> float:
+        """0 se il peso è stato concesso, altrimenti secondi da attendere prima di riprovare"""
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        floor = 0.0 if priority == REALTIME else self.reserve
+        if self.tokens - weight >= floor:
+            self.tokens -= weight
+            self.granted += 1
+            return 0.0
+        return (weight + floor - self.tokens) / self.rate
+
+    async def acquire(self, weight: int, priority: int = REALTIME, max_wait: float = REST_WEIGHT_MAX_WAIT) -> bool:
+        """Attende il peso (in coda); False se servirebbe più di `max_wait` secondi"""
+        deadline = time.monotonic() + max_wait
+        waited = False
+        while True:
+            wait = self.reserve_wait(weight, priority)
+            if not wait:
+                return True
+            if time.monotonic() + wait > deadline:
+                self.rejected += 1
+                return False
+            if not waited:
+                self.waited += 1
+                waited = True
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self, weight: int, priority: int = BULK):
+        """Come acquire, bloccante e senza limite di attesa (script)"""
+        while True:
+            wait = self.reserve_wait(weight, priority)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def observe(self, status: int, headers):
+        """Riallinea il bucket dopo una risposta (header del peso usato, 429/418)"""
+        used = headers.get(WEIGHT_HEADER)
+        if used is not None:
+            try:
+                self.used_weight = int(used)
+            except ValueError:
+                pass
+            else:
+                self._refill(time.monotonic())
+                self.tokens = min(self.tokens, self.capacity - self.used_weight)
+        if status in (418, 429):
+            self.rate_limited += 1
+            try:
+                retry_after = float(headers.get("Retry-After", 60))
+            except ValueError:
+                retry_after = 60.0
+            self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+            self.tokens = min(self.tokens, 0.0)
+            log.warning("Limite di peso Binance superato (HTTP %d), pausa di %.0fs", status, retry_after)
+
+    def stats(self) -> dict:
+        self._refill(time.monotonic())
+        return {
+            "tokens": round(self.tokens, 1),
+            "capacity": self.capacity,
+            "used_weight": self.used_weight,
+            "granted": self.granted,
+            "waited": self.waited,
+            "rejected": self.rejected,
+            "rate_limited": self.rate_limited,
+            "blocked": self.blocked_until > time.monotonic(),
+        }
+
+
+class BudgetedClient(Client):
+    """binance.Client per gli script (storico): ogni richiesta passa dal budget come BULK"""
+
+    def __init__(self, *args, budget: WeightBudget = None, **kwargs):
+        self.budget = budget or WeightBudget()
+        super().__init__(*args, **kwargs)
+
+    def _request(self, method, uri: str, signed: bool, force_params: bool = False, **kwargs):
+        weight = endpoint_weight(urlparse(uri).path, kwargs.get("data") or kwargs.get("params"))
+        while True:
+            self.budget.acquire_sync(weight, BULK)
+            try:
+                result = super()._request(method, uri, signed, force_params, **kwargs)
+            except BinanceAPIException as e:
+                self.budget.observe(e.status_code, e.response.headers if e.response is not None else {})
+                if e.status_code == 429:
+                    continue  # riprova dopo il Retry-After
+                raise
+            self.budget.observe(self.response.status_code, self.response.headers)
+            return result
+
+
+# budget condiviso dal processo
+budget = WeightBudget()
@@ -0,0 +1,222 @@
+import itertools
+import json
+import math
+import struct
+
+try:
+    import orjson
+except ImportError:  # opzionale: senza orjson il formato non è disponibile
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # opzionale: senza msgpack il formato non è disponibile
+    msgpack = None
+
+# Formati di trasmissione dei WebSocket, scelti dal client con ?format=...
+# "json"    → testo JSON con la libreria standard (default, come send_json)
+# "orjson"  → testo JSON codificato con orjson
+# "msgpack" → frame binario MessagePack con gli stessi campi del JSON
+# "struct"  → frame binario a layout fisso (solo candele e ticker; un array
+#             di ticker è la concatenazione dei singoli record)
+# Ogni payload viene avvolto in un Frame che memorizza la codifica per
+# formato: con N client sullo stesso simbolo la codifica avviene una volta.
+#
+# Protocollo delta (?delta=1, non con "struct"): il client riceve prima
+#   {"type": "snapshot", "seq": S, "data": {...payload completo}}
+# poi solo i campi cambiati rispetto al messaggio precedente
+#   {"type": "delta", "seq": S, "base": B, "data": {...campi cambiati}}
+# da fondere ricorsivamente sullo stato. Se `base` non è l'ultimo seq
+# ricevuto il client invia {"type": "resync"} e riceve un nuovo snapshot.
+# Sugli stream multiplexati ogni messaggio porta anche "key" (es.
+# "BTCUSDT@1s") e seq/base si riferiscono alla sequenza di quella chiave.
+# Gli heartbeat restano messaggi semplici, senza "type".
+
+FORMATS = ("json", "orjson", "msgpack", "struct")
+
+# layout little-endian dei frame "struct": tipo, simbolo (ASCII, zero-padded), campi
+CANDLE_STRUCT = struct.Struct("<B16sqdddddB")  # 1, s, t, o, h, l, c, v, flag
+CANDLE_CLOSED = 1   # flag: candela chiusa (x)
+CANDLE_PARTIAL = 2  # flag: barra aggregata che non copre tutto il periodo (p)
+TICKER_STRUCT = struct.Struct("<B16sddddd")    # 2, s, c, o, h, l, v
+CANDLE_TAG = 1
+TICKER_TAG = 2
+
+_seq = itertools.count(1)  # seq dei frame, crescente in tutto il processo
+
+
+def _json(payload) -> str:
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+
+
+def _orjson(payload) -> str:
+    return orjson.dumps(payload).decode()
+
+
+def _msgpack(payload) -> bytes:
+    return msgpack.packb(payload, use_bin_type=True)
+
+
+def _candle_struct(c) -> bytes:
+    flags = (CANDLE_CLOSED if c["x"] else 0) | (CANDLE_PARTIAL if c.get("p") else 0)
+    return CANDLE_STRUCT.pack(CANDLE_TAG, c["s"].encode(), c["t"], c["o"], c["h"], c["l"], c["c"], c["v"], flags)
+
+
+def _ticker_struct(t) -> bytes:
+    return TICKER_STRUCT.pack(TICKER_TAG, t["s"].encode(), t["c"], t["o"], t["h"], t["l"], t["v"])
+
+
+def _tickers_struct(tickers) -> bytes:
+    return b"".join(_ticker_struct(t) for t in tickers)
+
+
+_ENCODERS = {"json": _json, "orjson": _orjson, "msgpack": _msgpack}
+STRUCT_ENCODERS = {"candle": _candle_struct, "ticker": _ticker_struct, "tickers": _tickers_struct}
+
+
+def parse_format(name: str, layout: str = None, delta: bool = False) -> str:
+    """Valida il formato richiesto dal client; ValueError se non utilizzabile"""
+    name = (name or "json").lower()
+    if name not in FORMATS:
+        raise ValueError(f"formato non valido: {name} ({' | '.join(FORMATS)})")
+    if name == "orjson" and orjson is None:
+        raise ValueError("formato orjson non disponibile (pip install orjson)")
+    if name == "msgpack" and msgpack is None:
+        raise ValueError("formato msgpack non disponibile (pip install msgpack)")
+    if name == "struct" and layout not in STRUCT_ENCODERS:
+        raise ValueError("formato struct non disponibile per questo endpoint")
+    if name == "struct" and delta:
+        raise ValueError("il protocollo delta non è disponibile con il formato struct")
+    return name
+
+
+def parse_flag(value) -> bool:
+    return str(value).lower() in ("1", "true", "yes")
+
+
+def diff(old: dict, new: dict) -> dict:
+    """Campi di `new` diversi da `old`, ricorsivo sugli oggetti annidati"""
+    out = {}
+    for key, value in new.items():
+        prev = old.get(key, diff)  # `diff` come sentinella: chiave assente
+        if prev is value:
+            continue
+        if isinstance(value, dict) and isinstance(prev, dict):
+            changed = diff(prev, value)
+            if changed:
+                out[key] = changed
+        elif prev != value:
+            if isinstance(value, float) and isinstance(prev, float) and math.isnan(value) and math.isnan(prev):
+                continue
+            out[key] = value
+    return out
+
+
+class Frame:
+    """Payload condiviso tra i client con le codifiche già calcolate"""
+
+    __slots__ = ("payload", "layout", "stateful", "key", "seq", "_encoded")
+
+    def __init__(self, payload: dict, layout: str = None, stateful: bool = True, key: str = None):
+        self.payload = payload
+        self.layout = layout  # "candle" | "ticker" | "tickers" per il formato struct
+        self.stateful = stateful  # False per heartbeat e messaggi fuori dallo stato (mai in delta)
+        self.key = key  # stream multiplexato (es. "BTCUSDT@1s"): stato delta separato per chiave
+        self.seq = next(_seq)
+        self._encoded = {}
+
+    def encode(self, fmt: str):
+        """str per i formati JSON, bytes per quelli binari"""
+        data = self._encoded.get(fmt)
+        if data is None:
+            if fmt == "struct" and self.layout is None:
+                fmt = "json"  # messaggi di controllo: frame di testo anche per i client struct
+            encoder = STRUCT_ENCODERS[self.layout] if fmt == "struct" else _ENCODERS[fmt]
+            data = self._encoded[fmt] = encoder(self.payload)
+        return data
+
+    def snapshot(self, fmt: str):
+        """Messaggio snapshot del protocollo delta"""
+        key = ("snapshot", fmt)
+        data = self._encoded.get(key)
+        if data is None:
+            message = {"type": "snapshot", "seq": self.seq, "data": self.payload}
+            if self.key is not None:
+                message["key"] = self.key
+            data = self._encoded[key] = _ENCODERS[fmt](message)
+        return data
+
+    def delta(self, base: "Frame", fmt: str):
+        """Messaggio delta rispetto a `base`, condiviso dai client con la stessa base"""
+        key = ("delta", base.seq, fmt)
+        data = self._encoded.get(key)
+        if data is None:
+            message = {"type": "delta", "seq": self.seq, "base": base.seq, "data": diff(base.payload, self.payload)}
+            if self.key is not None:
+                message["key"] = self.key
+            data = self._encoded[key] = _ENCODERS[fmt](message)
+        return data
+
+
+class DeltaStream:
+    """Stato del protocollo delta per un client: ultimo frame inviato per chiave"""
+
+    def __init__(self, fmt: str):
+        self.fmt = fmt
+        self.bases = {}  # chiave del frame -> ultimo frame inviato
+        self.resyncs = 0
+
+    def resync(self) -> list:
+        """I prossimi messaggi saranno snapshot completi; restituisce gli ultimi stati inviati"""
+        last = list(self.bases.values())
+        self.bases.clear()
+        self.resyncs += 1
+        return last
+
+    def forget(self, key):
+        """Stream disiscritto: alla prossima iscrizione riparte da uno snapshot"""
+        self.bases.pop(key, None)
+
+    def encode(self, frame: Frame):
+        if not frame.stateful:
+            return frame.encode(self.fmt)
+        base = self.bases.get(frame.key)
+        self.bases[frame.key] = frame
+        if base is None:
+            return frame.snapshot(self.fmt)
+        return frame.delta(base, self.fmt)
+
+    async def receive_control(self, websocket, requeue=None):
+        """Legge i messaggi di controllo del client ({"type": "resync"}) fino alla
+        disconnessione; requeue(frame) ripropone subito l'ultimo stato come snapshot"""
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+            except ValueError:
+                continue
+            except Exception:
+                return  # disconnessione: la gestisce il loop di invio
+            if isinstance(message, dict) and message.get("type") == "resync":
+                for last in self.resync():
+                    if requeue is not None:
+                        requeue(last)
+
+
+def encode(frame: Frame, fmt: str, stream: DeltaStream = None):
+    return stream.encode(frame) if stream is not None else frame.encode(fmt)
+
+
+async def send_data(websocket, data):
+    if isinstance(data, bytes):
+        await websocket.send_bytes(data)
+    else:
+        await websocket.send_text(data)
+
+
+async def send_frame(websocket, frame: Frame, fmt: str, stream: DeltaStream = None):
+    await send_data(websocket, encode(frame, fmt, stream))
+
+
+def compression_offered(websocket) -> bool:
+    """True se il client propone permessage-deflate (negoziato dal server uvicorn)"""
+    return "permessage-deflate" in websocket.headers.get("sec-websocket-extensions", "")
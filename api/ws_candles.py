@@ -1,58 +1,183 @@
 from fastapi import APIRouter, WebSocket
-from binance import AsyncClient, BinanceSocketManager
 import asyncio
+import json
+import logging
+from .wire import Frame, DeltaStream, parse_format, parse_flag, compression_offered
+from .outbound import OutboundQueue, parse_policy, pump, close_slow
+from .kline_hub import hub, stream_key
+from .resampler import valid_interval
+from .settings import WS_SEND_QUEUE, CANDLES_MAX_STREAMS
+from .metrics import (
+    stage_histogram, sent_counter, bytes_counter, drops_counter, connections_gauge, slow_disconnects_counter,
+)
 
 router = APIRouter()
+log = logging.getLogger(__name__)
 active_connections = {}
+ENDPOINT = "candles1s"  # etichetta delle metriche
 
-async def handle_candle_1s_connection(websocket: WebSocket, symbol: str):
+# Protocollo di iscrizione (messaggi di testo JSON dal client):
+#   {"type": "subscribe",   "symbols": ["btcusdt", "ethusdt"], "interval": "1s"}
+#   {"type": "unsubscribe", "symbols": ["ethusdt"], "intervals": ["1s", "1m"]}
+#   {"type": "resync"}  (solo con ?delta=1)
+# Risposte: {"type": "subscribed" | "unsubscribed", "streams": [...]} oppure
+# {"type": "error", "message": ...}. Ogni candela porta simbolo "s" e
+# intervallo "i" (il formato struct non include l'intervallo). Oltre agli
+# intervalli Binance sono accettati i multipli di 1s che dividono il giorno
+# (5s, 15s, 10m, ...), aggregati dallo stream da 1s.
+
+
+class CandleConnection:
+    """Iscrizioni di un client: una coda di invio per tutti i suoi stream"""
+
+    def __init__(self, websocket: WebSocket, queue: OutboundQueue, delta_stream: DeltaStream = None):
+        self.websocket = websocket
+        self.queue = queue
+        self.delta_stream = delta_stream
+        self.streams = set()  # (simbolo, intervallo)
+
+    def reply(self, payload: dict):
+        # passa dalla coda per restare ordinato rispetto alle candele
+        self.queue.put(Frame(payload, stateful=False))
+
+    async def subscribe(self, symbols: list, intervals: list, ack: bool = True):
+        added = []
+        for symbol in symbols:
+            for interval in intervals:
+                if (symbol, interval) in self.streams:
+                    continue
+                if len(self.streams) >= CANDLES_MAX_STREAMS:
+                    self.reply({"type": "error", "message": f"massimo {CANDLES_MAX_STREAMS} stream per connessione"})
+                    break
+                await hub.subscribe(symbol, interval, self.queue)
+                self.streams.add((symbol, interval))
+                added.append(stream_key(symbol, interval))
+        if ack:
+            self.reply({"type": "subscribed", "streams": added})
+
+    async def unsubscribe(self, symbols: list, intervals: list):
+        removed = []
+        for symbol in symbols:
+            for interval in intervals:
+                if (symbol, interval) not in self.streams:
+                    continue
+                self.streams.discard((symbol, interval))
+                await hub.unsubscribe(symbol, interval, self.queue)
+                if self.delta_stream is not None:
+                    self.delta_stream.forget(stream_key(symbol, interval))
+                removed.append(stream_key(symbol, interval))
+        self.reply({"type": "unsubscribed", "streams": removed})
+
+    async def close(self):
+        for symbol, interval in list(self.streams):
+            await hub.unsubscribe(symbol, interval, self.queue)
+        self.streams.clear()
+
+    async def handle(self, message: dict):
+        kind = message.get("type")
+        if kind == "resync" and self.delta_stream is not None:
+            for frame in self.delta_stream.resync():
+                self.queue.put(frame, (frame.key, frame.payload["t"]))
+            return
+        if kind not in ("subscribe", "unsubscribe"):
+            self.reply({"type": "error", "message": f"messaggio non valido: {kind}"})
+            return
+        symbols = message.get("symbols") or ([message["symbol"]] if message.get("symbol") else [])
+        intervals = message.get("intervals") or [message.get("interval", "1s")]
+        if not isinstance(symbols, list) or not isinstance(intervals, list) or not all(
+                isinstance(s, str) for s in symbols + intervals):
+            self.reply({"type": "error", "message": "symbols e intervals devono essere liste di stringhe"})
+            return
+        bad = [i for i in intervals if not valid_interval(i)]
+        if bad:
+            self.reply({"type": "error", "message": f"intervallo non valido: {', '.join(bad)}"})
+            return
+        symbols = [s.upper() for s in symbols]
+        if kind == "subscribe":
+            await self.subscribe(symbols, intervals)
+        else:
+            await self.unsubscribe(symbols, intervals)
+
+    async def receive(self):
+        """Legge i messaggi di controllo del client fino alla disconnessione"""
+        while True:
+            try:
+                text = await self.websocket.receive_text()
+            except Exception:
+                return  # disconnessione
+            try:
+                message = json.loads(text)
+            except ValueError:
+                self.reply({"type": "error", "message": "JSON non valido"})
+                continue
+            if isinstance(message, dict):
+                await self.handle(message)
+
+
+async def handle_candle_1s_connection(websocket: WebSocket, symbol: str, fmt: str = "json", delta: bool = False,
+                                      queue_policy: str = "conflate", interval: str = "1s"):
     await websocket.accept()
     connection_id = id(websocket)
     active_connections[connection_id] = websocket
-    
-    print(f"✅ WebSocket connesso per {symbol}")
-    
-    client = None
+
+    log.info("WebSocket candles1s connesso", extra={
+        "symbol": symbol, "format": fmt, "delta": delta, "deflate": compression_offered(websocket),
+    })
+
+    # metriche per connessione: gli stream upstream sono contati dall'hub per simbolo
+    m_send = stage_histogram("send", ENDPOINT, "ALL")
+    m_sent = sent_counter(ENDPOINT, "ALL")
+    m_bytes = bytes_counter(ENDPOINT, "ALL")
+    m_slow = slow_disconnects_counter(ENDPOINT, "ALL")
+    m_connections = connections_gauge(ENDPOINT, "ALL")
+    m_connections.inc()
+
+    # delta: simbolo e open non cambiano dentro la candela e non vengono reinviati
+    delta_stream = DeltaStream(fmt) if delta else None
+    # gli stream condivisi accodano soltanto, l'invio al client avviene nel task `sender`
+    queue = OutboundQueue(WS_SEND_QUEUE, queue_policy, drops=drops_counter(ENDPOINT, "ALL"))
+    sender = asyncio.create_task(pump(websocket, queue, fmt, delta_stream, m_send, m_sent, m_bytes))
+    conn = CandleConnection(websocket, queue, delta_stream)
+    receiver = None
     try:
-        client = await AsyncClient.create()
-        bsm = BinanceSocketManager(client)
-        
-        # Usa kline_socket per dati consistenti
-        async with bsm.kline_socket(symbol=symbol.lower(), interval="1s") as stream:
-            while True:
-                data = await stream.recv()
-                
-                if data and "k" in data:
-                    kline = data["k"]
-                    candle = {
-                        "t": kline["t"],        # timestamp in ms
-                        "s": kline["s"],        # symbol
-                        "o": float(kline["o"]), # open
-                        "h": float(kline["h"]), # high
-                        "l": float(kline["l"]), # low
-                        "c": float(kline["c"]), # close
-                        "v": float(kline["v"]), # volume
-                        "x": kline["x"]         # is closed
-                    }
-                    
-                    try:
-                        await websocket.send_json(candle)
-                    except:
-                        break
-                        
+        if symbol:
+            # compatibilità: ?symbol= iscrive subito il simbolo, senza conferma
+            # (i client esistenti si aspettano solo candele)
+            await conn.subscribe([symbol.upper()], [interval], ack=False)
+        receiver = asyncio.create_task(conn.receive())
+        # termina alla disconnessione (receiver) o se il client è troppo lento (sender)
+        await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
     except Exception as e:
-        print(f"❌ Errore: {e}")
+        log.error("Errore WebSocket candles1s: %s", e, extra={"symbol": symbol})
     finally:
+        # prima i task della connessione, poi le iscrizioni condivise
+        queue.close()
+        tasks = [t for t in (sender, receiver) if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await conn.close()
+        if await close_slow(websocket, queue, m_slow):
+            log.warning("Client lento disconnesso", extra={"symbol": symbol, **queue.stats()})
+        m_connections.dec()
         if connection_id in active_connections:
             del active_connections[connection_id]
-        if client:
-            await client.close_connection()
-        print(f"🔚 Connessione chiusa per {symbol}")
+        log.info("Connessione candles1s chiusa", extra={"symbol": symbol})
 
 # ✅ ROTTA CORRETTA: /ws/candles1s con parametro query
 @router.websocket("/ws/candles1s")
 async def websocket_candles_1s(websocket: WebSocket):
-    # Estrai il simbolo dai query parameters
+    # Estrai il simbolo dai query parameters (vuoto = nessuna iscrizione iniziale)
     symbol = websocket.query_params.get("symbol", "btcusdt")
-    
-    await handle_candle_1s_connection(websocket, symbol)
\ No newline at end of file
+    interval = websocket.query_params.get("interval", "1s")
+    try:
+        if not valid_interval(interval):
+            raise ValueError(f"intervallo non valido: {interval}")
+        delta = parse_flag(websocket.query_params.get("delta"))
+        fmt = parse_format(websocket.query_params.get("format"), "candle", delta)
+        queue_policy = parse_policy(websocket.query_params.get("queue"), "conflate")
+    except ValueError as e:
+        await websocket.close(code=1003, reason=str(e))
+        return
+
+    await handle_candle_1s_connection(websocket, symbol, fmt, delta, queue_policy, interval)
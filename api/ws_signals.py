@@ -1,70 +1,77 @@
 from fastapi import APIRouter, WebSocket, Query
 from starlette.websockets import WebSocketDisconnect
-from binance import AsyncClient, BinanceSocketManager, Client
-import numpy as np, time, pandas as pd
-from .ai_utils import compute_features, models, FEATURE_COLUMNS
+import numpy as np, time
+from .ai_utils import models, model_key_for, FEATURE_COLUMNS
+from .indicators import StreamingFeatures
+from .inference import scheduler
+from .ring_buffer import CandleRing
+from .candle_bootstrap import bootstrap
+from .candle_store import store
+from .settings import (
+    SIGNAL_WINDOW,
+    SIGNAL_EVAL_MODE, SIGNAL_DEBOUNCE_MS, SIGNAL_CHANGE_THRESHOLD,
+)
+from .eval_policy import EvalPolicy
+from .binance_clients import get_socket_manager
+from .signal_hub import SignalHub, SymbolFeed
+from .order_journal import OrderJournal
+from .log import debug_sampled
+from .outbound import parse_policy, close_slow, send_bounded
+from .wire import Frame, DeltaStream, parse_format, encode, compression_offered
+from .metrics import (
+    stage_histogram, messages_counter, sent_counter, bytes_counter, connections_gauge, upstream_connected,
+    slow_disconnects_counter, allow_symbols,
+)
 import json, pathlib
 import asyncio
 import math
+import logging
 
 router = APIRouter()
+log = logging.getLogger(__name__)
+ENDPOINT = "signals"  # etichetta delle metriche
+allow_symbols(models)  # simboli con un modello proprio: etichetta dedicata nelle metriche
 
 orders = []  # storico ordini simulati
 order_id = 0
-ORDERS_FILE = pathlib.Path("orders.json")
+ORDERS_FILE = pathlib.Path("orders.json")  # formato precedente, migrato nel journal
+ORDERS_JOURNAL = pathlib.Path("orders.jsonl")
+journal = OrderJournal(ORDERS_JOURNAL, legacy_path=ORDERS_FILE)
 CANDLES_FILE = pathlib.Path("candles.json")
 last_save_time = 0  # ⏱ controllo frequenza salvataggio
 
 
 # ------------------ Utils ------------------
 
-def compute_macd(prices, fast=12, slow=26, signal=9):
-    """Calcolo MACD con Pandas (senza TA-Lib)"""
-    df = pd.DataFrame(prices, columns=["close"])
-    df["ema_fast"] = df["close"].ewm(span=fast, adjust=False).mean()
-    df["ema_slow"] = df["close"].ewm(span=slow, adjust=False).mean()
-    df["macd"] = df["ema_fast"] - df["ema_slow"]
-    df["signal"] = df["macd"].ewm(span=signal, adjust=False).mean()
-    df["hist"] = df["macd"] - df["signal"]
-    return (
-        float(df["macd"].iloc[-1]),
-        float(df["signal"].iloc[-1]),
-        float(df["hist"].iloc[-1]),
-    )
+def _finite(value: float) -> float:
+    """NaN (indicatore non ancora pronto) → 0.0, come il fillna(0) delle feature"""
+    return 0.0 if math.isnan(value) else value
 
 
 # ------------------ Persistenza ------------------
 
-def save_orders():
+def load_orders():
+    """Recupera gli ultimi ordini dal journal e riprende la numerazione"""
+    global orders, order_id
     try:
-        with open(ORDERS_FILE, "w") as f:
-            json.dump(orders[-500:], f)  # salva max 500 ordini
+        orders = journal.recover()[-200:]
+        order_id = max((o.get("id", 0) for o in orders), default=0)
+        log.info("Ordini caricati: %d", len(orders))
     except Exception as e:
-        print(f"❌ Errore salvataggio ordini: {e}")
+        log.error("Errore caricamento ordini: %s", e)
 
 
-def load_orders():
-    global orders
-    if ORDERS_FILE.exists():
-        try:
-            with open(ORDERS_FILE) as f:
-                orders = json.load(f)
-            print(f"📂 Ordini caricati: {len(orders)}")
-        except Exception as e:
-            print(f"❌ Errore caricamento ordini: {e}")
-
-
-def save_candles(symbol: str, candles: list):
+def save_candles(symbol: str, window: CandleRing):
     global last_save_time
     now = int(time.time())
     if now - last_save_time < 60:  # salva massimo una volta al minuto
         return
     try:
         with open(CANDLES_FILE, "w") as f:
-            json.dump({symbol: candles[-300:]}, f)  # tieni solo ultime 300
+            json.dump({symbol: window.to_records()}, f)  # finestra del ring, senza slicing
         last_save_time = now
     except Exception as e:
-        print(f"❌ Errore salvataggio candele: {e}")
+        log.error("Errore salvataggio candele: %s", e)
 
 
 def load_candles(symbol: str):
@@ -74,217 +81,256 @@ def load_candles(symbol: str):
                 data = json.load(f)
             return data.get(symbol, [])
         except Exception as e:
-            print(f"❌ Errore caricamento candele: {e}")
+            log.error("Errore caricamento candele: %s", e)
     return []
 
 
-# ------------------ WebSocket segnali AI ------------------
+# ------------------ Pipeline condivisa per simbolo ------------------
 
-@router.websocket("/ws/signals")
-async def ws_signals(websocket: WebSocket, symbol: str = Query("BTCUSDT")):
+async def run_signal_pipeline(feed: SymbolFeed):
+    """Uno stream Binance e un calcolo features/predizione per simbolo,
+    il payload viene pubblicato a tutti i client iscritti"""
     global order_id
 
+    symbol_upper = feed.symbol
+    model_key = feed.model_key
+
+    bsm = await get_socket_manager()
+
+    # ✅ Bootstrap iniziale con le candele storiche (asincrono, condiviso e in cache)
+    window = CandleRing(SIGNAL_WINDOW)
+    features = StreamingFeatures()
+    try:
+        history = await bootstrap.get(symbol_upper, "1m")
+        window.extend(history.view())
+        # gli indicatori partono da tutta la storia, anche se la finestra è più corta
+        features.seed(history.column("c"), history.column("t"))
+        log.info("Bootstrap: %d candele storiche caricate", len(window), extra={"symbol": symbol_upper})
+    except Exception as e:
+        log.warning("Errore bootstrap storico: %s", e, extra={"symbol": symbol_upper})
+
+    # Usa interval più lungo per performance
+    ts = bsm.kline_socket(symbol_upper.lower(), interval="1m")
+    last_heartbeat = time.time()
+
+    # metriche per stadio (handle risolti una volta per pipeline)
+    m_upstream = stage_histogram("upstream", ENDPOINT, symbol_upper)
+    m_features = stage_histogram("features", ENDPOINT, symbol_upper)
+    m_inference = stage_histogram("inference", ENDPOINT, symbol_upper)
+    m_messages = messages_counter(ENDPOINT, symbol_upper)
+
+    async with ts as stream:
+        upstream_connected(ENDPOINT, symbol_upper)
+        while True:
+            try:
+                # ✅ TIMEOUT E HEARTBEAT
+                msg = await asyncio.wait_for(stream.recv(), timeout=30.0)
+            except asyncio.TimeoutError:
+                log.info("Timeout ricezione dati, invio heartbeat", extra={"symbol": symbol_upper})
+                feed.publish(Frame({"heartbeat": True, "t": int(time.time()), "symbol": symbol_upper}, stateful=False))
+                last_heartbeat = time.time()
+                continue
+
+            # Invia heartbeat ogni 15 secondi
+            current_time = time.time()
+            if current_time - last_heartbeat > 15:
+                feed.publish(Frame({"heartbeat": True, "t": int(current_time), "symbol": symbol_upper}, stateful=False))
+                last_heartbeat = current_time
+                log.debug("Heartbeat inviato", extra={"symbol": symbol_upper})
+
+            if not msg or "k" not in msg:
+                log.warning("Messaggio upstream non valido: %s", msg, extra={"symbol": symbol_upper})
+                continue
+
+            k = msg["k"]
+            m_messages.inc()
+            if "E" in msg:
+                # ritardo tra l'evento su Binance e la ricezione qui
+                m_upstream.observe(max(0.0, time.time() - msg["E"] / 1000))
+            debug_sampled(log, ("kline", symbol_upper), "Kline ricevuta: %s (chiusa: %s)", k["c"], k["x"], symbol=symbol_upper)
+
+            # la finestra aggiorna la candela in corso invece di accodare ogni tick
+            window.push(k["t"], float(k["o"]), float(k["h"]), float(k["l"]), float(k["c"]), float(k["v"]))
+            store.update(symbol_upper, "1m", k)  # /candles dalla memoria
+            if k["x"]:
+                bootstrap.update(symbol_upper, "1m", k)  # cache pronta per le prossime pipeline
+
+            # ✅ CALCOLO FEATURES (incrementale, O(1) per messaggio)
+            started = time.perf_counter()
+            try:
+                row = features.update(float(k["c"]), bool(k["x"]), k["t"])
+                m_features.observe(time.perf_counter() - started)
+            except Exception as e:
+                log.error("Errore elaborazione features: %s", e, extra={"symbol": symbol_upper})
+                continue
+
+            if not features.ready:
+                debug_sampled(log, ("warmup", symbol_upper), "Accumulando dati: %d/20", features.closed_count, symbol=symbol_upper)
+                continue
+
+            price = row["close"]
+            ts_now = int(time.time())
+            now = time.monotonic()
+
+            # ✅ POLITICA DI VALUTAZIONE: i client non da rivalutare ricevono solo il prezzo
+            due = feed.due(price, bool(k["x"]), now)
+            if len(due) < len(feed.subscribers) and feed.last_frame is not None:
+                price_update = Frame(dict(feed.last_frame.payload, close=price, action=None, t=ts_now))
+                feed.publish(price_update, feed.subscribers.difference(due))
+            if not due:
+                continue
+
+            # ✅ PREDIZIONE (in batch con gli altri simboli dello stesso modello)
+            started = time.perf_counter()
+            try:
+                proba = await scheduler.predict(model_key, [_finite(row[col]) for col in FEATURE_COLUMNS])
+                m_inference.observe(time.perf_counter() - started)
+            except Exception as e:
+                log.error("Errore predizione: %s", e, extra={"symbol": symbol_upper})
+                continue
+
+            pred = int(np.argmax(proba))
+
+            labels = ["Strong SELL", "Weak SELL", "HOLD", "Weak BUY", "Strong BUY"]
+            signal = labels[pred]
+            confidence = float(proba[pred])
+
+            probs_dict = {labels[i]: round(float(p), 3) for i, p in enumerate(proba)}
+
+            # ✅ SIMULAZIONE ORDINI (una sola volta per simbolo, non per client)
+            action = None
+            if ("BUY" in signal or "SELL" in signal) and confidence > 0.55:
+                order_id += 1
+                action = "BUY" if "BUY" in signal else "SELL"
+                order = {
+                    "id": order_id,
+                    "t": ts_now,
+                    "symbol": symbol_upper,
+                    "price": price,
+                    "signal": signal,
+                    "confidence": round(confidence, 3),
+                    "side": action
+                }
+                orders.append(order)
+                orders[:] = orders[-200:]
+                journal.append(order)  # scritto in background, nessun I/O nell'event loop
+                log.info("Ordine simulato", extra=order)
+
+            # ✅ FIX RSI
+            rsi_val = row["rsi"]
+            if math.isnan(rsi_val):
+                rsi_val = 50.0
+
+            payload = {
+                "symbol": symbol_upper,
+                "close": price,
+                "ma5": row["ma5"],
+                "ma20": row["ma20"],
+                "rsi": rsi_val,
+                "macd": {   # 👈 sempre oggetto con 3 valori
+                    "macd": _finite(row["macd"]),
+                    "signal": _finite(row["macd_signal"]),
+                    "hist": _finite(row["macd_diff"])
+                },
+                "signal": signal,
+                "confidence": round(confidence, 3),
+                "probs": probs_dict,
+                "action": action,
+                "t": ts_now
+            }
+            frame = Frame(payload)  # codificato una volta per formato, non per client
+            feed.publish(frame, due)
+            for sub in due:
+                sub.policy.mark(price, now)
+            feed.last_frame = frame
+            debug_sampled(log, ("signal", symbol_upper), "Segnale %s (%.3f) a %d client", signal, confidence, len(due), symbol=symbol_upper)
+
+
+hub = SignalHub(run_signal_pipeline, ENDPOINT)
+
+
+# ------------------ WebSocket segnali AI ------------------
+
+@router.websocket("/ws/signals")
+async def ws_signals(
+    websocket: WebSocket,
+    symbol: str = Query("BTCUSDT"),
+    mode: str = Query(SIGNAL_EVAL_MODE),        # tick | close | debounce | change
+    debounce_ms: int = Query(SIGNAL_DEBOUNCE_MS),
+    threshold: float = Query(SIGNAL_CHANGE_THRESHOLD),
+    format: str = Query("json"),                # json | orjson | msgpack
+    delta: bool = Query(False),                 # snapshot + soli campi cambiati
+    queue: str = Query("drop_oldest")           # drop_oldest | conflate (solo l'ultimo segnale)
+):
     symbol_upper = symbol.upper()
-    print(f"🔗 Richiesta WebSocket signals per: {symbol_upper}")
+    log.info("Richiesta WebSocket signals", extra={"symbol": symbol_upper, "mode": mode})
+
+    try:
+        policy = EvalPolicy(mode, debounce_ms, threshold)
+        fmt = parse_format(format, delta=delta)
+        queue_policy = parse_policy(queue, "drop_oldest")
+    except ValueError as e:
+        await websocket.close(code=1003, reason=str(e))
+        return
 
     # ✅ VERIFICA E GESTISCI MODELLO MANCANTE
-    model = models.get(symbol_upper)
-    if not model:
-        print(f"⚠️  Modello non trovato per {symbol_upper}, uso BTCUSDT come fallback")
-        model = models.get("BTCUSDT")
-    
-    if not model:
+    model_key = model_key_for(symbol_upper)
+    if model_key and model_key != symbol_upper:
+        log.warning("Modello non trovato, uso %s come fallback", model_key, extra={"symbol": symbol_upper})
+
+    if not model_key:
         error_msg = f"❌ Nessun modello disponibile per {symbol_upper}"
-        print(error_msg)
+        log.error(error_msg)
         await websocket.close(code=1003, reason=error_msg)
         return
 
     await websocket.accept()
-    print(f"✅ WebSocket signals APERTO per {symbol_upper}")
-
-    client = await AsyncClient.create()
-    bsm = BinanceSocketManager(client)
-
-    # ✅ Bootstrap iniziale con 50 candele storiche
-    closes, highs, lows, volumes = [], [], [], []
+    log.info("WebSocket signals aperto", extra={
+        "symbol": symbol_upper, "format": fmt, "delta": delta, "deflate": compression_offered(websocket),
+    })
+
+    m_serialize = stage_histogram("serialize", ENDPOINT, symbol_upper)
+    m_send = stage_histogram("send", ENDPOINT, symbol_upper)
+    m_sent = sent_counter(ENDPOINT, symbol_upper)
+    m_bytes = bytes_counter(ENDPOINT, symbol_upper)
+    m_slow = slow_disconnects_counter(ENDPOINT, symbol_upper)
+    m_connections = connections_gauge(ENDPOINT, symbol_upper)
+    m_connections.inc()
+
+    # la pipeline accoda senza attendere: questo loop è l'unico che aspetta il client
+    sub = await hub.subscribe(symbol_upper, model_key, policy, queue_policy)
+    stream = DeltaStream(fmt) if delta else None
+    control = asyncio.create_task(stream.receive_control(websocket, sub.put)) if delta else None
     try:
-        rest_client = Client()
-        data = rest_client.get_klines(symbol=symbol_upper, interval="1m", limit=50)
-        closes = [float(c[4]) for c in data]
-        highs = [float(c[2]) for c in data]
-        lows = [float(c[3]) for c in data]
-        volumes = [float(c[5]) for c in data]
-        print(f"📂 Bootstrap: {len(closes)} candele storiche caricate per {symbol_upper}")
-    except Exception as e:
-        print(f"⚠️ Errore bootstrap storico per {symbol_upper}: {e}")
-
-    try:
-        # Usa interval più lungo per performance
-        ts = bsm.kline_socket(symbol.lower(), interval="1m")
-        last_heartbeat = time.time()
-
-        async with ts as stream:
-            while True:
-                try:
-                    # ✅ TIMEOUT E HEARTBEAT
-                    msg = await asyncio.wait_for(stream.recv(), timeout=30.0)
-
-                    # Invia heartbeat ogni 15 secondi
-                    current_time = time.time()
-                    if current_time - last_heartbeat > 15:
-                        try:
-                            await websocket.send_json({
-                                "heartbeat": True,
-                                "t": int(current_time),
-                                "symbol": symbol_upper
-                            })
-                            last_heartbeat = current_time
-                            print(f"💓 Heartbeat inviato per {symbol_upper}")
-                        except:
-                            break
-
-                    k = msg["k"]
-                    print(f"📡 Dati ricevuti per {symbol_upper}: {k['c']} (chiuso: {k['x']})")
-
-                    closes.append(float(k["c"]))
-                    highs.append(float(k["h"]))
-                    lows.append(float(k["l"]))
-                    volumes.append(float(k["v"]))
-
-                    # Mantieni solo ultimi 100 punti
-                    closes, highs, lows, volumes = closes[-100:], highs[-100:], lows[-100:], volumes[-100:]
-
-                    if len(closes) < 20:
-                        print(f"⏳ Accumulando dati: {len(closes)}/20")
-                        continue
-
-                    # ✅ PREPARAZIONE DATI
-                    df = pd.DataFrame({
-                        "open": closes, "close": closes, "high": highs,
-                        "low": lows, "volume": volumes
-                    })
-
-                    # ✅ CALCOLO FEATURES
-                    try:
-                        df = compute_features(df)
-                        if df.empty:
-                            print("⚠️  DataFrame vuoto dopo compute_features")
-                            continue
-
-                        for col in FEATURE_COLUMNS:
-                            if col not in df.columns:
-                                df[col] = 0.0
-                                print(f"⚠️  Colonna {col} mancante, impostata a 0")
-
-                        X = df[FEATURE_COLUMNS].iloc[[-1]].fillna(0)
-
-                        # ✅ PREDIZIONE
-                        try:
-                            proba = model.predict_proba(X)[0]
-                            pred = int(np.argmax(proba))
-
-                            labels = ["Strong SELL", "Weak SELL", "HOLD", "Weak BUY", "Strong BUY"]
-                            signal = labels[pred]
-                            confidence = float(proba[pred])
-                            price = float(closes[-1])
-                            ts_now = int(time.time())
-
-                            probs_dict = {labels[i]: round(float(p), 3) for i, p in enumerate(proba)}
-
-                            # ✅ SIMULAZIONE ORDINI
-                            action = None
-                            if ("BUY" in signal or "SELL" in signal) and confidence > 0.55:
-                                order_id += 1
-                                action = "BUY" if "BUY" in signal else "SELL"
-                                order = {
-                                    "id": order_id,
-                                    "t": ts_now,
-                                    "symbol": symbol_upper,
-                                    "price": price,
-                                    "signal": signal,
-                                    "confidence": round(confidence, 3),
-                                    "side": action
-                                }
-                                orders.append(order)
-                                orders[:] = orders[-200:]
-                                save_orders()
-                                print(f"💾 Ordine simulato: {order}")
-
-                            last_row = df.iloc[-1]
-
-                            # ✅ CALCOLO MACD
-                            last_macd, last_signal, last_hist = compute_macd(df["close"].values)
-
-                            # ✅ FIX RSI
-                            rsi_val = last_row.get("rsi", 50)
-                            if rsi_val is None or math.isnan(rsi_val):
-                                rsi_val = 50.0
-                            
-                            # ✅ Calcolo MACD (manuale, sempre stesso formato)
-                            last_macd, last_signal, last_hist = compute_macd(df["close"].values)
-                            # ✅ INVIO DATI
-                            try:
-                                payload = {
-                                    "symbol": symbol_upper,
-                                    "close": price,
-                                    "ma5": float(last_row.get("ma5", 0)),
-                                    "ma20": float(last_row.get("ma20", 0)),
-                                    "rsi": float(rsi_val),
-                                    "macd": {   # 👈 sempre oggetto con 3 valori
-                                    "macd": last_macd,
-                                    "signal": last_signal,
-                                    "hist": last_hist
-                                },
-                                    "signal": signal,
-                                    "confidence": round(confidence, 3),
-                                    "probs": probs_dict,
-                                    "action": action,
-                                    "t": ts_now
-                                }
-                                await websocket.send_json(payload)
-                                print(f"📤 Inviati dati a client: {payload['signal']} ({confidence})")
-
-                            except WebSocketDisconnect:
-                                print(f"🔌 Client disconnesso durante l'invio")
-                                break
-                            except Exception as e:
-                                print(f"⚠️  Errore invio WebSocket: {e}")
-                                continue
-
-                        except Exception as e:
-                            print(f"❌ Errore predizione: {e}")
-                            continue
-
-                    except Exception as e:
-                        print(f"❌ Errore elaborazione features: {e}")
-                        continue
-
-                except asyncio.TimeoutError:
-                    print(f"⏰ Timeout ricezione dati per {symbol_upper}, invio heartbeat")
-                    try:
-                        await websocket.send_json({
-                            "heartbeat": True,
-                            "t": int(time.time()),
-                            "symbol": symbol_upper
-                        })
-                        last_heartbeat = time.time()
-                    except:
-                        print(f"❌ Errore invio heartbeat, probabilmente client disconnesso")
-                        break
-                except Exception as e:
-                    print(f"❌ Errore ricezione dati: {e}")
+        while True:
+            frame = await sub.queue.get()
+            if frame is None:
+                if await close_slow(websocket, sub.queue, m_slow):
+                    log.warning("Client lento disconnesso", extra={"symbol": symbol_upper, **sub.queue.stats()})
                     break
-
+                # pipeline terminata (errore upstream): il client si riconnetterà
+                await websocket.close(code=1011)
+                break
+            # codifica separata dall'invio per misurare i due stadi
+            started = time.perf_counter()
+            data = encode(frame, fmt, stream)
+            serialized = time.perf_counter()
+            if not await send_bounded(websocket, sub.queue, data):
+                continue  # socket bloccato: coda chiusa, il prossimo get chiude il client (1013)
+            m_serialize.observe(serialized - started)
+            m_send.observe(time.perf_counter() - serialized)
+            m_sent.inc()
+            m_bytes.inc(len(data))
     except WebSocketDisconnect:
-        print(f"🔌 Client disconnesso da /ws/signals ({symbol_upper})")
+        log.info("Client disconnesso da /ws/signals", extra={"symbol": symbol_upper})
     except Exception as e:
-        print(f"❌ Errore generale WebSocket: {e}")
+        log.error("Errore generale WebSocket: %s", e, extra={"symbol": symbol_upper})
     finally:
-        try:
-            await client.close_connection()
-            print(f"🔚 Connessione chiusa per {symbol_upper}")
-        except:
-            pass
+        if control is not None:
+            control.cancel()
+        m_connections.dec()
+        await hub.unsubscribe(symbol_upper, sub)
+        log.info("Connessione signals chiusa", extra={"symbol": symbol_upper})
 
 
 # ------------------ Endpoint REST ordini ------------------
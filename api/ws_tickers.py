@@ -1,62 +1,103 @@
 # ws_tickers.py - Versione corretta
 from fastapi import WebSocket
-from binance import AsyncClient, BinanceSocketManager
 from starlette.websockets import WebSocketDisconnect
 import asyncio
+import logging
+from .wire import parse_format
+from .outbound import OutboundQueue, parse_policy, pump, pump_batches, close_slow
+from .ticker_hub import hub, parse_symbols
+from .settings import WS_SEND_QUEUE, TICKERS_SNAPSHOT_HZ, TICKERS_SNAPSHOT_MAX_HZ, TICKERS_SNAPSHOT_QUEUE
+from .metrics import (
+    stage_histogram, sent_counter, drops_counter, connections_gauge, slow_disconnects_counter,
+)
 
+log = logging.getLogger(__name__)
 active_ticker_connections = {}
+MODES = ("stream", "snapshot")
+
+# ?mode=stream   → un messaggio per ogni aggiornamento di ticker (default)
+# ?mode=snapshot → a cadenza fissa (?hz=, default TICKERS_SNAPSHOT_HZ) un solo
+#                  frame con l'array dei ticker cambiati dal frame precedente
+
+
+def parse_snapshot_hz(value) -> float:
+    """Cadenza richiesta dal client; ValueError se fuori da (0, TICKERS_SNAPSHOT_MAX_HZ]"""
+    hz = float(value) if value else TICKERS_SNAPSHOT_HZ
+    if not 0 < hz <= TICKERS_SNAPSHOT_MAX_HZ:
+        raise ValueError(f"hz deve essere tra 0 e {TICKERS_SNAPSHOT_MAX_HZ:g}")
+    return hz
+
+
+def stream_queue_size(symbols) -> int:
+    """Posti della coda in modalità stream: un messaggio upstream di tutto il
+    mercato pubblica centinaia di simboli insieme e devono entrarci tutti"""
+    if symbols is None:
+        symbols = hub.universe
+    size = len(symbols) if symbols is not None else TICKERS_SNAPSHOT_QUEUE
+    return max(WS_SEND_QUEUE, size)
+
 
 def register_ws_tickers(app):
     @app.websocket("/ws/tickers")
     async def ws_tickers(websocket: WebSocket):
+        try:
+            fmt = parse_format(websocket.query_params.get("format"), "ticker")
+            queue_policy = parse_policy(websocket.query_params.get("queue"), "conflate")
+            mode = (websocket.query_params.get("mode") or "stream").lower()
+            if mode not in MODES:
+                raise ValueError(f"modalità non valida: {mode} ({' | '.join(MODES)})")
+            hz = parse_snapshot_hz(websocket.query_params.get("hz"))
+        except ValueError as e:
+            await websocket.close(code=1003, reason=str(e))
+            return
+        # ?symbols=btcusdt,ethusdt limita i ticker ricevuti (default: tutti quelli del feed)
+        symbols = parse_symbols(websocket.query_params.get("symbols"))
         await websocket.accept()
-        client = None
         connection_id = id(websocket)
         active_ticker_connections[connection_id] = websocket
-        
-        try:
-            client = await AsyncClient.create()
-            bsm = BinanceSocketManager(client)
-            
-            # Streams per i simboli più popolari
-            streams = [
-                "btcusdt@miniTicker", "ethusdt@miniTicker", "bnbusdt@miniTicker",
-                "solusdt@miniTicker", "xrpusdt@miniTicker", "adausdt@miniTicker",
-                "dogeusdt@miniTicker", "dotusdt@miniTicker", "avaxusdt@miniTicker",
-                "linkusdt@miniTicker"
-            ]
-            
-            ts = bsm.multiplex_socket(streams)
-
-            async with ts as stream:
-                while True:
-                    msg = await stream.recv()
-                    data = msg.get("data", {})
-                    
-                    # Formatta i dati in modo compatibile con il frontend
-                    if data:
-                        ticker = {
-                            "s": data.get("s", ""),  # symbol
-                            "c": float(data.get("c", 0)),  # current price
-                            "o": float(data.get("o", data.get("c", 0))),  # open price
-                            "h": float(data.get("h", 0)),  # high price
-                            "l": float(data.get("l", 0)),  # low price
-                            "v": float(data.get("v", 0))   # volume
-                        }
-                        
-                        # Invia solo se la connessione è ancora attiva
-                        if connection_id in active_ticker_connections:
-                            try:
-                                await websocket.send_json(ticker)
-                            except:
-                                break
 
+        m_send = stage_histogram("send", "tickers", "ALL")
+        m_sent = sent_counter("tickers", "ALL")
+        m_slow = slow_disconnects_counter("tickers", "ALL")
+        m_connections = connections_gauge("tickers", "ALL")
+        m_connections.inc()
+
+        # il feed condiviso accoda soltanto, l'invio al client avviene nel task `sender`
+        if mode == "snapshot":
+            # un posto per simbolo: la coda conflata è l'insieme dei ticker cambiati
+            queue = OutboundQueue(TICKERS_SNAPSHOT_QUEUE, "conflate", drops=drops_counter("tickers", "ALL"))
+            sender = asyncio.create_task(pump_batches(websocket, queue, fmt, 1.0 / hz, "tickers", m_send, m_sent))
+        else:
+            queue = OutboundQueue(stream_queue_size(symbols), queue_policy, drops=drops_counter("tickers", "ALL"))
+            sender = asyncio.create_task(pump(websocket, queue, fmt, None, m_send, m_sent))
+        receiver = None
+
+        try:
+            await hub.subscribe(queue, symbols)
+            receiver = asyncio.create_task(_wait_disconnect(websocket))
+            # termina alla disconnessione (receiver) o se il client è troppo lento (sender)
+            await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
         except WebSocketDisconnect:
-            print("🔌 Client disconnesso da /ws/tickers")
+            log.info("Client disconnesso da /ws/tickers")
         except Exception as e:
-            print(f"⚠️ Errore WS tickers: {e}")
+            log.warning("Errore WS tickers: %s", e)
         finally:
+            queue.close()
+            await hub.unsubscribe(queue)
+            tasks = [t for t in (sender, receiver) if t is not None]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if await close_slow(websocket, queue, m_slow):
+                log.warning("Client lento disconnesso da /ws/tickers", extra=queue.stats())
+            m_connections.dec()
             if connection_id in active_ticker_connections:
                 del active_ticker_connections[connection_id]
-            if client:
-                await client.close_connection()
\ No newline at end of file
+
+
+async def _wait_disconnect(websocket: WebSocket):
+    """Ignora i messaggi del client fino alla disconnessione"""
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
@@ -39,7 +39,8 @@ export class TickerService {
     this.subject = new Subject<Ticker>();
     this.tickerState.setConnectionStatus(false);
 
-    const wsUrl = `ws://localhost:8000/ws/tickers`;
+    // snapshot: un array dei ticker cambiati a cadenza fissa invece di un messaggio per ticker
+    const wsUrl = `ws://localhost:8000/ws/tickers?mode=snapshot`;
     
     try {
       this.ws = new WebSocket(wsUrl);
@@ -52,14 +53,17 @@ export class TickerService {
 
       this.ws.onmessage = (event) => {
         try {
-          const ticker = JSON.parse(event.data) as Ticker;
-          
-          // ✅ Aggiorna lo stato condiviso
-          this.tickerState.updateTicker(ticker);
-          
-          // ✅ Notifica i subscribers
-          if (this.subject) {
-            this.subject.next(ticker);
+          const data = JSON.parse(event.data) as Ticker | Ticker[];
+          const tickers = Array.isArray(data) ? data : [data];
+
+          for (const ticker of tickers) {
+            // ✅ Aggiorna lo stato condiviso
+            this.tickerState.updateTicker(ticker);
+
+            // ✅ Notifica i subscribers
+            if (this.subject) {
+              this.subject.next(ticker);
+            }
           }
         } catch (error) {
           console.error('❌ Errore parsing ticker:', error, event.data);